@@ -20,7 +20,215 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 #importing libraries
+import os
+import time
+import queue
+import atexit
+import threading
 from datetime import datetime
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class _LogFile:
+    """
+    One shared handle and in-memory buffer per log file, used by every Logging instance writing to it
+    
+    Keyword arguments: None
+    
+    argument -- 
+        file_path : location of the log file
+    
+    Return: None 
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._handle = None
+        self._buffer = list()
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, line, flush=False):
+        with self._lock:
+            self._buffer.append(line)
+            self._size += len(line)
+            if (flush or self._size >= _settings["buffer_size"]
+                    or time.monotonic() - self._last_flush >= _settings["flush_interval"]):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        if self._handle is not None and self._moved():
+            # another process (a prefork worker) rotated the file
+            self._handle.close()
+            self._handle = None
+        if self._handle is None:
+            self._handle = open(self.file_path, "a+")
+        self._handle.write("".join(self._buffer))
+        self._handle.flush()
+        self._buffer.clear()
+        self._size = 0
+
+        if _settings["max_bytes"] and self._handle.tell() >= _settings["max_bytes"]:
+            self._rotate()
+
+    def _moved(self):
+        try:
+            return os.stat(self.file_path).st_ino != os.fstat(self._handle.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _rotate(self):
+        # file.txt -> file.txt.1 -> file.txt.2 ... the oldest one is dropped,
+        # processes sharing the file rotate it one at a time and only once
+        if fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        try:
+            if not self._moved():
+                backup_count = _settings["backup_count"]
+                for i in range(backup_count - 1, 0, -1):
+                    source = f"{self.file_path}.{i}"
+                    if os.path.exists(source):
+                        os.replace(source, f"{self.file_path}.{i + 1}")
+                if backup_count:
+                    os.replace(self.file_path, f"{self.file_path}.1")
+                else:
+                    os.remove(self.file_path)
+        finally:
+            self._handle.close()
+            self._handle = None
+
+    def reset(self):
+        # after a fork the child drops what belongs to the parent
+        self._lock = threading.Lock()
+        self._handle = None
+        self._buffer = list()
+        self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+
+_settings = {
+    "buffer_size": 8192,      # bytes kept in memory before writing
+    "flush_interval": 1.0,    # seconds after which the buffer is flushed
+    "background": False,      # whether messages go through a queue to a writer thread
+    "queue_size": 10000,      # messages waiting for the writer thread, writing is synchronous when it is full
+    "max_bytes": 10 * 1024 * 1024,  # size at which a log file is rotated, 0 for never
+    "backup_count": 5,        # rotated files kept
+}
+_files = dict()
+_files_lock = threading.Lock()
+_queue = None
+_writer = None
+_flusher = None
+_timestamp = [None, ""]  # the formatted time is reused for every message in the same second
+
+
+def _get_log_file(file_path):
+    log_file = _files.get(file_path)
+    if log_file is None:
+        with _files_lock:
+            log_file = _files.setdefault(file_path, _LogFile(file_path))
+    return log_file
+
+
+def _now():
+    second = int(time.time())
+    if _timestamp[0] != second:
+        _timestamp[1] = datetime.fromtimestamp(second).strftime("%d/%m/%Y, %H:%M:%S")
+        _timestamp[0] = second
+    return _timestamp[1]
+
+
+def _write_loop():
+    while True:
+        try:
+            item = _queue.get(timeout=_settings["flush_interval"])
+        except queue.Empty:
+            flush_all()
+            continue
+        if item is None:
+            flush_all()
+            return
+        log_file, line, flush = item
+        log_file.write(line, flush)
+
+
+def _start_writer():
+    global _queue, _writer
+    with _files_lock:
+        if _writer is None or not _writer.is_alive():
+            _queue = queue.Queue(maxsize=_settings["queue_size"])
+            _writer = threading.Thread(target=_write_loop, name="log-writer", daemon=True)
+            _writer.start()
+
+
+def _flush_loop():
+    # flushes quiet log files in synchronous mode, the writer thread does it in background mode
+    while _flusher is threading.current_thread():
+        time.sleep(_settings["flush_interval"])
+        flush_all()
+
+
+def _start_flusher():
+    global _flusher
+    with _files_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="log-flusher", daemon=True)
+            _flusher.start()
+
+
+def _stop_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        _queue.put(None)
+        _writer.join()
+    _writer = None
+
+
+def flush_all():
+    """writes every buffered message to its file"""
+    for log_file in list(_files.values()):
+        log_file.flush()
+
+
+def close_all():
+    """stops the writer and flusher threads and closes every log file"""
+    global _flusher
+    _flusher = None
+    _stop_writer()
+    for log_file in list(_files.values()):
+        log_file.close()
+
+
+def _after_fork_in_child():
+    global _writer, _queue, _flusher
+    _writer = None
+    _queue = None
+    _flusher = None
+    for log_file in _files.values():
+        log_file.reset()
+
+
+atexit.register(close_all)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=flush_all, after_in_child=_after_fork_in_child)
+
 
 class Logging:
     """
@@ -37,10 +245,36 @@ class Logging:
     
     def __init__(self, file_path):
         self.file_path = file_path
+        self._log_file = _get_log_file(file_path)
 
     def __repr__(self):
         return f"Logging({self.file_path})"
 
+    @staticmethod
+    def configure(**settings):
+        """
+        changes how every log file is written
+        
+        Args:
+            buffer_size -> int: bytes kept in memory before writing
+            flush_interval -> float: seconds after which the buffer is flushed
+            background -> bool: whether messages are written by a background thread through a queue
+            queue_size -> int: messages waiting for the background thread
+            max_bytes -> int: size at which a log file is rotated, 0 for never
+            backup_count -> int: rotated files kept
+        """
+        unknown = set(settings) - set(_settings)
+        if unknown:
+            raise ValueError(f"unknown logging settings: {sorted(unknown)}")
+        flush_all()
+        if not settings.get("background", _settings["background"]):
+            _stop_writer()
+        _settings.update(settings)
+
+    def flush(self):
+        """writes the buffered messages of this log file"""
+        self._log_file.flush()
+
     def log(self, message, log_type):
         """
         custom log method
@@ -49,10 +283,20 @@ class Logging:
             message -> str: message to be logged
             log_type -> str: type of message to be logged ,for example = ("info","error", etc..)
         """   
-             
-        date_time = datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
-        with open(self.file_path, "a+") as f:
-            f.write(date_time + " -> " + log_type + ": " + message + "\n")
+        line = _now() + " -> " + log_type + ": " + str(message) + "\n"
+        # errors are written at once so they survive a crash
+        flush = log_type == "ERROR"
+        if _settings["background"]:
+            if _writer is None:
+                _start_writer()
+            try:
+                _queue.put_nowait((self._log_file, line, flush))
+                return
+            except queue.Full:
+                pass
+        elif _flusher is None:
+            _start_flusher()
+        self._log_file.write(line, flush)
 
     def info(self, message, log_type="INFO"):
         """
@@ -62,9 +306,7 @@ class Logging:
             message -> str: message to be logged
             log_type -> str: INFO 
         """   
-        date_time = datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
-        with open(self.file_path, "a+") as f:
-            f.write(date_time + " -> " + log_type + ": " + message + "\n")
+        self.log(message, log_type)
 
     def warning(self, message, log_type="WARNING"):
         """
@@ -74,9 +316,7 @@ class Logging:
             message -> str: message to be logged
             log_type -> str: WARNING 
         """   
-        date_time = datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
-        with open(self.file_path, "a+") as f:
-            f.write(date_time + " -> " + log_type + ": " + message + "\n")
+        self.log(message, log_type)
 
     def error(self, message, log_type="ERROR"):
         """
@@ -86,9 +326,7 @@ class Logging:
             message -> str: message to be logged
             log_type -> str: ERROR 
         """   
-        date_time = datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
-        with open(self.file_path, "a+") as f:
-            f.write(date_time + " -> " + log_type + ": " + message + "\n")
+        self.log(message, log_type)
 
 
 if __name__ == "__main__":
@@ -21,64 +21,164 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 # importing libraries
 import os
-import pandas as pd
 from dotenv import load_dotenv
-from flask import Flask, request, render_template
+import time
+import threading
+from flask import Flask, Response, request, render_template, jsonify, g
 
 # importing custom packages
-from data_import.data_input import DataInput
-from data_cleaning.data_cleaning import Cleaner
-from training_model.training import TrainingAPI
+from training_model.jobs import TrainingJobRunner
 from predicting_model.prediction import PredictAPI
-from email_yagmail.email_bot_using_yagmail import email_send
+from predicting_model.prediction_cache import PredictionCache
+from email_yagmail.email_bot_using_yagmail import email_send_async
+from email_yagmail.mail_queue import close_mail_queue
+from instrumentation.metrics import metrics
+from Logging.logger import Logging
 
 #loading environment variables
 load_dotenv()
 
 #making an instance of app
 app = Flask(__name__)
+log = Logging(os.path.join("Prediction_Logs", "7-app.txt"))
+
+#models are loaded once through the model registry and shared by every request
+prediction = PredictAPI(prediction_cache=PredictionCache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_ENTRIES", 10000)),
+    max_bytes=int(os.getenv("PREDICTION_CACHE_BYTES", 32 * 1024 * 1024)),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL", 0)) or None),
+    artifact_name=os.getenv("MODEL_ARTIFACT"),
+    abstain_threshold=float(os.getenv("ABSTAIN_THRESHOLD", 0)) or None)
+
+#training runs in a background process so it never blocks a serving thread
+training_jobs = TrainingJobRunner()
+
+#set once the models are loaded and warmed up, reported by /readyz
+ready = threading.Event()
+startup = {"status": "starting", "error": None, "seconds": None}
+WARM_UP_REVIEWS = ["This movie was great, I loved every minute of it!",
+                   "Worst film I have ever seen, a complete waste of time.",
+                   "The plot was predictable <br /><br /> but the actors didn't disappoint."]
+
+
+def warm_up():
+    """
+    loads and validates the models, then runs a few predictions so the tokenizer, the stemmer
+    and the scorer are warm before the first real request, the cached warm up predictions and
+    their timings are dropped so /metrics and /predict/cache only report real traffic
+    """
+    start = time.perf_counter()
+    try:
+        prediction.load_models()
+        prediction.predict_many(WARM_UP_REVIEWS)
+        #the single review path builds the fast scorer itself, unless an artifact is served
+        for review in WARM_UP_REVIEWS:
+            prediction.predict_review(review)
+        prediction.prediction_cache.clear()
+        prediction.prediction_cache.reset_stats()
+        metrics.reset()
+        startup.update(status="ready", seconds=time.perf_counter() - start)
+        ready.set()
+    except Exception as e:
+        startup.update(status="failed", error=str(e))
+        raise
+
+
+def start_warm_up():
+    """warms up in a background thread so /healthz answers while the models load"""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+#Server-Timing header with the time of every stage, off unless SERVER_TIMING is set
+server_timing = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    if server_timing:
+        metrics.start_request()
+
+
+@app.after_request
+def record_timing(response):
+    elapsed = time.perf_counter() - g.request_start
+    if server_timing:
+        stages = metrics.end_request()
+        entries = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in stages.items()]
+        entries.append(f"total;dur={elapsed * 1000:.3f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    metrics.observe(f"http.{request.endpoint}", elapsed, error=response.status_code >= 500)
+    return response
+
+
+#API for the liveness probe
+@app.route('/healthz', methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+#API for the readiness probe, ready once the models are loaded and warmed up
+@app.route('/readyz', methods=["GET"])
+def readyz():
+    return jsonify(startup), 200 if ready.is_set() else 503
+
+
+#API for Prometheus
+@app.route('/metrics', methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.prometheus_text(), mimetype="text/plain; version=0.0.4")
+
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
 
-#API to train the model
+#API to train the model, the job runs in a background process
 @app.route('/train', methods=["GET", "POST"])
 def train():
-    data_input = DataInput()
-    data_cleaning = Cleaner()
-    csv_path = os.path.join("Cleaned_Csv_Files", "cleaned_data.csv")
-    if "Cleaned_Csv_Files" not in os.listdir():
-        os.mkdir("Cleaned_Csv_Files")
-
     if request.method == "POST":
-        json_data = request.json()
-        df = data_input.ret_dataframe(json_data["input_csv_path"])
-        df_cleaned = data_cleaning.ret_cleaned_dataframe(df)
-        data_cleaning.save_dataframe_in_csv(df_cleaned, csv_path)
-
-        del df
-        del df_cleaned
-
-        df_cleaned = pd.read_csv(csv_path)
-        y = df_cleaned["sentiment"]
-
-        train = TrainingAPI(cleaned_csv_path=csv_path)
-        x_vector = train.vectorize()
-        cm, cl_report = train.train_model(x_vector, y)
-
-        print(cm)
-        print(cl_report)
+        json_data = request.get_json(silent=True) or {}
+        if "input_csv_path" not in json_data:
+            return jsonify({"error": "'input_csv_path' is required"}), 400
+
+        job_id = training_jobs.submit(json_data["input_csv_path"], n_jobs=json_data.get("n_jobs", -1),
+                                      use_cache=json_data.get("use_cache", True),
+                                      review_col=json_data.get("review_col", "review"),
+                                      label_col=json_data.get("label_col", "sentiment"),
+                                      dedup=json_data.get("dedup", True),
+                                      calibration=json_data.get("calibration", "sigmoid"))
+        return jsonify({"job_id": job_id, "status_url": f"/train/{job_id}"}), 202
+    return jsonify({"jobs": training_jobs.jobs()})
+
+
+#API to check a training job
+@app.route('/train/<job_id>', methods=["GET"])
+def train_status(job_id):
+    job = training_jobs.status(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
+
+
+#API to get the scores of a finished training job
+@app.route('/train/<job_id>/metrics', methods=["GET"])
+def train_metrics(job_id):
+    job = training_jobs.status(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    if job["status"] != "finished":
+        return jsonify({"error": f"job is {job['status']}"}), 409
+    return jsonify(job["metrics"])
 
 
 #API to predict
 @app.route('/predict', methods=["POST", "GET"])
 def predict():
-    prediction = PredictAPI()
-
     if request.method == "POST":    
-        if request.json:
+        if request.is_json:
             data = request.json
             review = data["review"]
         elif request.form:
@@ -88,28 +188,63 @@ def predict():
         else:
             return "nothing_happened"
 
-        print("Review:",review)
-        clean_sentence = prediction.clean_sentence(review)
-        predicted_data = prediction.predict_model_sentence(clean_sentence)
-        return render_template("index.html",review=review,prediction=predicted_data)
+        log.info(f"Review: {review}")
+        predicted_data = prediction.predict_review(review)["label"]
+        with metrics.timer("app.render_template"):
+            return render_template("index.html",review=review,prediction=predicted_data)
     
+
+
+#API to predict a batch of reviews in one call
+@app.route('/predict/batch', methods=["POST"])
+def predict_batch():
+    data = request.get_json(silent=True) or {}
+    reviews = data.get("reviews")
+    if not isinstance(reviews, list) or not all(isinstance(review, str) for review in reviews):
+        return jsonify({"error": "'reviews' must be a list of strings"}), 400
+
+    predictions = prediction.predict_many(reviews)
+    return jsonify({"predictions": predictions})
+
+
+
+#API to size the prediction cache
+@app.route('/predict/cache', methods=["GET"])
+def predict_cache():
+    #every prefork worker has its own cache, the pid tells them apart
+    return jsonify(dict(prediction.prediction_cache.stats(), pid=os.getpid()))
+
         
 @app.route('/contact',methods=['POST'])
 def contact():
     if request.method == "POST":    
         if request.form:
             data = request.form
-            print(data)
             to_email = data["toemail"]
             message = data["message"]
-            email_send(to_email,message)
+            # queued for the background mail worker so the request does not wait on SMTP
+            if not email_send_async(to_email,message):
+                log.warning("Mail queue full, query not sent")
         else:
-            print("Nothing happened")
+            log.warning("Contact form without data")
     return render_template("index.html")
 
 if __name__ == "__main__":
     from waitress import serve
     
     port = int(os.getenv("PORT")) #to acess heroku port
-    serve(app, host="0.0.0.0", port=port) #for production
+    workers = int(os.getenv("WEB_CONCURRENCY", 1)) #processes sharing the preloaded models
+    threads = int(os.getenv("WAITRESS_THREADS", 4)) #threads in every process
+
+    if workers > 1 and hasattr(os, "fork"):
+        from serving.prefork import PreforkServer
+
+        PreforkServer(app, host="0.0.0.0", port=port, workers=workers, threads=threads,
+                      preload=warm_up, #models are loaded once and shared copy-on-write
+                      max_requests=int(os.getenv("MAX_REQUESTS", 0)),
+                      max_requests_jitter=int(os.getenv("MAX_REQUESTS_JITTER", 0)),
+                      on_worker_exit=[close_mail_queue]).run() #queued /contact mails are sent before a worker exits
+    else:
+        start_warm_up() #/readyz reports ready once the models are warm
+        serve(app, host="0.0.0.0", port=port, threads=threads) #for production
     # app.run(host="0.0.0.0",port=port, debug=True) #for development
\ No newline at end of file
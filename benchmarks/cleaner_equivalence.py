@@ -0,0 +1,116 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# Checks that Cleaner.review_to_words gives exactly the output of the original
+# letter by letter implementation, run from the project root:
+#     python -m benchmarks.cleaner_equivalence "IMDB Dataset.csv" --rows 5000
+
+# importing libraries
+import sys
+import time
+import nltk
+import string
+import argparse
+import tempfile
+import pandas as pd
+from nltk.stem import PorterStemmer
+from nltk.corpus import stopwords
+
+# importing custom packages
+from data_cleaning.data_cleaning import Cleaner
+
+
+class ReferenceCleaner:
+    """
+    The original implementation of Cleaner.review_to_words, kept only for comparison
+
+    Keyword arguments: None
+
+    Return: None
+    """
+
+    def __init__(self):
+        self.stemmer = PorterStemmer()
+        self.stop_words = stopwords.words('english')
+        self.unnecessary_words = ["br", "'ll",
+                                  "..", "....", "n't", "...", " ... "]
+        self.punctuation = string.punctuation
+
+    def review_to_words(self, sentence):
+        words = nltk.word_tokenize(sentence)
+        words_list = list()
+        for word in words:
+            word = word.lower()
+            letter_list = list()
+            if word not in self.stop_words:
+                if word not in self.unnecessary_words:
+                    for letter in word:
+                        if letter not in self.punctuation:
+                            letter_list.append(letter)
+                    if letter_list:
+                        word = ''.join(letter_list)
+                        words_list.append(self.stemmer.stem(word))
+        return " ".join(words_list)
+
+
+def compare(reviews):
+    """
+    cleans every review with both the implementations
+
+    Args:
+        reviews (iterable): raw reviews
+
+    Returns:
+        (list, float, float): mismatching reviews, reference seconds, current seconds
+    """
+    reference = ReferenceCleaner()
+    cleaner = Cleaner(tempfile.gettempdir(), "cleaner_equivalence.txt")
+    reviews = list(reviews)
+
+    start = time.perf_counter()
+    expected = [reference.review_to_words(review) for review in reviews]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [cleaner.review_to_words(review) for review in reviews]
+    current_time = time.perf_counter() - start
+
+    mismatches = [review for review, e, a in zip(reviews, expected, actual) if e != a]
+    return mismatches, reference_time, current_time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cleaner.review_to_words equivalence check")
+    parser.add_argument("csv_path", help="CSV file with the reviews in the first column")
+    parser.add_argument("--rows", type=int, default=None, help="number of rows to compare")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.csv_path, nrows=args.rows)
+    mismatches, reference_time, current_time = compare(df[df.columns[0]].dropna())
+
+    print(f"reviews: {len(df)}  reference: {reference_time:.2f}s  current: {current_time:.2f}s")
+    for review in mismatches[:10]:
+        print("MISMATCH:", review[:200])
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
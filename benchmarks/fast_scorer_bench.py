@@ -0,0 +1,91 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# Parity check and per review latency of FastScorer against sklearn, run from the project root:
+#     python -m benchmarks.fast_scorer_bench "IMDB Dataset.csv" --rows 2000
+
+# importing libraries
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+# importing custom packages
+from data_cleaning.data_cleaning import Cleaner
+from predicting_model.prediction import PredictAPI
+from predicting_model.fast_scorer import FastScorer
+
+
+def latency(function, docs):
+    """
+    calls function once per document
+
+    Args:
+        function (callable): function of one document
+        docs (list): documents
+
+    Returns:
+        dict: mean, p50 and p99 latency in microseconds
+    """
+    timings = list()
+    for doc in docs:
+        start = time.perf_counter()
+        function(doc)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1e6
+    return {"mean_us": timings.mean(), "p50_us": np.percentile(timings, 50), "p99_us": np.percentile(timings, 99)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FastScorer parity and latency")
+    parser.add_argument("csv_path", help="CSV file with the raw reviews in the first column")
+    parser.add_argument("--rows", type=int, default=2000, help="number of reviews")
+    parser.add_argument("--training-folder", default="Training_Data", help="folder with the saved models")
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="largest accepted score difference")
+    args = parser.parse_args(argv)
+
+    prediction = PredictAPI(training_folder_path=args.training_folder, log_folder_name=tempfile.gettempdir())
+    vector, model = prediction.load_models()
+    scorer = FastScorer.from_models(vector, model)
+
+    cleaner = Cleaner(tempfile.gettempdir(), "fast_scorer_bench.txt")
+    df = pd.read_csv(args.csv_path, nrows=args.rows)
+    docs = [cleaner.review_to_words(review) for review in df[df.columns[0]].dropna()]
+
+    expected = model.decision_function(vector.transform(docs))
+    actual = np.array([scorer.decision_value(doc) for doc in docs])
+    difference = np.abs(expected - actual).max()
+    same_labels = (model.predict(vector.transform(docs)) == np.array([scorer.predict_one(doc)[0] for doc in docs])).all()
+    print(f"reviews: {len(docs)}  max score difference: {difference:.3g}  same labels: {same_labels}")
+
+    sklearn_latency = latency(lambda doc: model.decision_function(vector.transform([doc])), docs)
+    scorer_latency = latency(scorer.decision_value, docs)
+    for name, result in (("sklearn", sklearn_latency), ("FastScorer", scorer_latency)):
+        print(f"{name:>10}: " + "  ".join(f"{key}={value:.1f}" for key, value in result.items()))
+    print(f"speedup (mean): {sklearn_latency['mean_us'] / scorer_latency['mean_us']:.1f}x")
+
+    return 0 if difference <= args.tolerance and same_labels else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# Checks MailQueue against a local SMTP server (aiosmtpd): queued mails arrive, a rejected mail
+# is retried and then counted as failed, and a full queue drops new mails. Run from the project root:
+#     python -m benchmarks.mail_queue_check
+
+# importing libraries
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from aiosmtpd.controller import Controller
+
+# importing custom packages
+from email_yagmail.mail_queue import MailQueue
+
+
+class RecordingHandler:
+    """
+    aiosmtpd handler keeping the subject of every accepted mail, it can reject the next mails
+    or hold them until released
+
+    Keyword arguments: None
+
+    Return: None
+    """
+
+    def __init__(self):
+        self.subjects = list()
+        self.reject = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    async def handle_DATA(self, server, session, envelope):
+        while not self.release.is_set():
+            await asyncio.sleep(0.01)
+        if self.reject:
+            self.reject -= 1
+            return "451 Try again later"
+        for line in envelope.content.decode("utf-8", "replace").splitlines():
+            if line.startswith("Subject:"):
+                self.subjects.append(line[len("Subject:"):].strip())
+        return "250 OK"
+
+
+def _mail_queue(port, **kwargs):
+    return MailQueue("bot@example.com", "", host="127.0.0.1", port=port, smtp_ssl=False, smtp_starttls=False,
+                     smtp_skip_login=True, backoff=0.01, **kwargs)
+
+
+def _wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def check_delivery(handler, port):
+    mail_queue = _mail_queue(port)
+    for i in range(3):
+        assert mail_queue.enqueue("reader@example.com", f"delivery {i}", "<p>Thank you</p>")
+    assert mail_queue.join(10), "the queue was not drained"
+    assert _wait_for(lambda: len([s for s in handler.subjects if s.startswith("delivery")]) == 3, 5), \
+        f"expected 3 delivered mails, got {handler.subjects}"
+    assert mail_queue.stats()["sent"] == 3, mail_queue.stats()
+    mail_queue.close()
+
+
+def check_retries(handler, port):
+    mail_queue = _mail_queue(port, max_retries=3)
+    handler.reject = 2
+    assert mail_queue.enqueue("reader@example.com", "retried", "body")
+    assert mail_queue.join(10), "the queue was not drained"
+    assert "retried" in handler.subjects, "the retried mail did not arrive"
+    assert mail_queue.stats()["sent"] == 1 and mail_queue.stats()["failed"] == 0, mail_queue.stats()
+
+    handler.reject = 4  # one more than the retries
+    assert mail_queue.enqueue("reader@example.com", "given up", "body")
+    assert mail_queue.join(10), "the queue was not drained"
+    assert "given up" not in handler.subjects, "a rejected mail was recorded"
+    assert mail_queue.stats()["failed"] == 1, mail_queue.stats()
+    handler.reject = 0
+    mail_queue.close()
+
+
+def check_queue_full(handler, port):
+    mail_queue = _mail_queue(port, maxsize=2)
+    handler.release.clear()  # the worker blocks on the first mail, the next ones wait in the queue
+    accepted = [mail_queue.enqueue("reader@example.com", f"full {i}", "body") for i in range(5)]
+    handler.release.set()
+    assert accepted.count(False) >= 1 and mail_queue.stats()["dropped"] == accepted.count(False), \
+        (accepted, mail_queue.stats())
+    assert mail_queue.join(10), "the queue was not drained"
+    delivered = [s for s in handler.subjects if s.startswith("full")]
+    assert len(delivered) == accepted.count(True), (delivered, accepted)
+    mail_queue.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MailQueue check against a local SMTP server")
+    parser.add_argument("--port", type=int, default=8025, help="port of the local SMTP server")
+    args = parser.parse_args(argv)
+
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        for check in (check_delivery, check_retries, check_queue_full):
+            check(handler, args.port)
+            print(f"{check.__name__}: ok")
+    except AssertionError as e:
+        print(f"FAILED: {e}")
+        return 1
+    finally:
+        controller.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# Reproducible timing of cleaning, vectorizing, training and prediction on synthetic reviews,
+# with an HTTP load test against /predict on a local waitress server. Run from the project root:
+#     python -m benchmarks.run_benchmarks --rows 5000 --output bench.json
+#     python -m benchmarks.run_benchmarks --rows 5000 --output new.json --compare bench.json --threshold 0.2
+
+# importing libraries
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# importing custom packages
+from benchmarks.synthetic import generate_reviews
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(function, repeat=3):
+    """
+    runs function repeat times
+
+    Args:
+        function (callable): function without arguments
+        repeat (int, optional): number of runs. Defaults to 3.
+
+    Returns:
+        (dict, object): best and median seconds, the value returned by the last run
+    """
+    timings = list()
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        timings.append(time.perf_counter() - start)
+    return {"seconds": min(timings), "median_seconds": float(np.median(timings))}, value
+
+
+def run_pipeline_benchmarks(rows, min_words, max_words, repeat, n_jobs):
+    """
+    times every stage of the pipeline inside the current working directory
+
+    Args:
+        rows (int): number of synthetic reviews
+        min_words (int): shortest review in words
+        max_words (int): longest review in words
+        repeat (int): runs of every stage
+        n_jobs (int): processes used by the parallel cleaning benchmark
+
+    Returns:
+        dict: stage -> timings
+    """
+    from data_cleaning.data_cleaning import Cleaner
+    from training_model.training import TrainingAPI
+    from predicting_model.prediction import PredictAPI
+
+    results = dict()
+    df = generate_reviews(rows, min_words, max_words)
+    df.to_csv("reviews.csv", index=False)
+    cleaner = Cleaner()
+
+    sample = df["review"].tolist()[:min(rows, 1000)]
+    timing, _ = measure(lambda: [cleaner.review_to_words(review) for review in sample], repeat)
+    results["cleaner.review_to_words"] = dict(timing, items=len(sample),
+                                             per_item_us=timing["seconds"] / len(sample) * 1e6)
+
+    timing, cleaned = measure(lambda: cleaner.ret_cleaned_dataframe(df.copy()), repeat)
+    results["cleaner.ret_cleaned_dataframe"] = dict(timing, items=rows)
+    timing, _ = measure(lambda: cleaner.ret_cleaned_dataframe(df.copy(), n_jobs=n_jobs), repeat)
+    results[f"cleaner.ret_cleaned_dataframe[n_jobs={n_jobs}]"] = dict(timing, items=rows)
+
+    train = TrainingAPI()
+    timing, x_vector = measure(lambda: train.vectorize(data=cleaned), repeat)
+    results["training.vectorize"] = dict(timing, items=rows)
+    timing, _ = measure(lambda: train.train_model(x_vector, cleaned["sentiment"]), repeat)
+    results["training.train_model"] = dict(timing, items=rows, f1_weighted=train.metrics["f1_weighted"])
+
+    prediction = PredictAPI()
+    cleaned_sample = cleaned["review"].tolist()[:len(sample)]
+    timing, _ = measure(lambda: [prediction.predict_model_sentence(review) for review in cleaned_sample], repeat)
+    results["predict.predict_model_sentence"] = dict(timing, items=len(cleaned_sample),
+                                                    per_item_us=timing["seconds"] / len(cleaned_sample) * 1e6)
+    timing, _ = measure(lambda: prediction.predict_many(sample), repeat)
+    results["predict.predict_many"] = dict(timing, items=len(sample),
+                                          per_item_us=timing["seconds"] / len(sample) * 1e6)
+    timing, _ = measure(lambda: prediction.predict_model_csv(cleaned.copy(), model_name="svc_model.sav"), repeat)
+    results["predict.predict_model_csv"] = dict(timing, items=rows)
+    return results
+
+
+def run_http_benchmark(requests, concurrency, reviews):
+    """
+    serves the app with waitress on a free local port and posts reviews to /predict
+
+    Args:
+        requests (int): number of requests
+        concurrency (int): requests in flight at the same time
+        reviews (list): reviews posted in turn, the first one warms up, pass requests + 1 distinct reviews
+            so the prediction cache does not answer for the cleaning and the model
+
+    Returns:
+        dict: throughput, latency quantiles and the hit rate of the prediction cache during the run
+    """
+    from waitress.server import create_server
+    import app as application
+
+    server = create_server(application.app, host="127.0.0.1", port=0, threads=concurrency)
+
+    def run():
+        try:
+            server.run()
+        except OSError:
+            pass  # the listening socket is closed under the loop on shutdown
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.effective_port}/predict"
+
+    def post(review):
+        body = json.dumps({"review": review}).encode("utf-8")
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    cache = application.prediction.prediction_cache
+    try:
+        post(reviews[0])  # warm up
+        before = cache.stats() if cache is not None else None
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = np.array(list(executor.map(
+                post, (reviews[1 + i % (len(reviews) - 1)] for i in range(requests)))))
+        elapsed = time.perf_counter() - start
+        after = cache.stats() if cache is not None else None
+    finally:
+        # let the worker threads finish their last response before the trigger they write to is closed
+        server.task_dispatcher.shutdown(timeout=5)
+        server.close()
+
+    hit_rate = None
+    if cache is not None:
+        hits = after["hits"] - before["hits"]
+        lookups = hits + after["misses"] - before["misses"]
+        hit_rate = hits / lookups if lookups else 0.0
+    return {"seconds": elapsed, "items": requests, "concurrency": concurrency,
+            "requests_per_second": requests / elapsed, "cache_hit_rate": hit_rate,
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "p99_ms": float(np.percentile(latencies, 99) * 1000)}
+
+
+def compare(results, baseline, threshold):
+    """
+    finds the stages slower than the baseline by more than threshold
+
+    Args:
+        results (dict): current run
+        baseline (dict): earlier run
+        threshold (float): accepted slowdown, 0.2 is 20%
+
+    Returns:
+        list: (stage, baseline seconds, current seconds) of every regression
+    """
+    regressions = list()
+    for stage, current in results["results"].items():
+        previous = baseline["results"].get(stage)
+        if previous and current["seconds"] > previous["seconds"] * (1 + threshold):
+            regressions.append((stage, previous["seconds"], current["seconds"]))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="IMDB review analyser benchmarks")
+    parser.add_argument("--rows", type=int, default=5000, help="number of synthetic reviews")
+    parser.add_argument("--min-words", type=int, default=50, help="shortest review in words")
+    parser.add_argument("--max-words", type=int, default=300, help="longest review in words")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every stage, the best one is kept")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="processes of the parallel cleaning benchmark")
+    parser.add_argument("--requests", type=int, default=500, help="requests of the HTTP load test")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight in the HTTP load test")
+    parser.add_argument("--skip-http", action="store_true", help="skip the HTTP load test")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--compare", help="earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="accepted slowdown against --compare")
+    args = parser.parse_args(argv)
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # every model, log and csv is written to a scratch folder, never into the project
+    workdir = tempfile.mkdtemp(prefix="imdb_bench_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        for folder in ("Training_Logs", "Prediction_Logs"):
+            os.mkdir(folder)
+        shutil.copytree(os.path.join(PROJECT_ROOT, "templates"), "templates")
+
+        results = run_pipeline_benchmarks(args.rows, args.min_words, args.max_words, args.repeat, args.n_jobs)
+        if not args.skip_http:
+            # a distinct review per request, so the prediction cache does not stand in for the pipeline
+            sample = generate_reviews(args.requests + 1, args.min_words, args.max_words, seed=16)["review"].tolist()
+            results["http.predict"] = run_http_benchmark(args.requests, args.concurrency, sample)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"meta": {"timestamp": datetime.now().isoformat(), "git_commit": _git_commit(),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "cpu_count": os.cpu_count(), "args": vars(args)},
+              "results": results}
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for stage, result in results.items():
+        extra = ""
+        if "p50_ms" in result:
+            extra = f"  p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms"
+            if result.get("cache_hit_rate") is not None:
+                extra += f" cache hit rate={result['cache_hit_rate']:.1%}"
+        print(f"{stage:<45} {result['seconds']:>10.4f}s{extra}")
+    print(f"results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for stage, previous, current in regressions:
+            print(f"REGRESSION {stage}: {previous:.4f}s -> {current:.4f}s")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, PROJECT_ROOT)
+    sys.exit(main())
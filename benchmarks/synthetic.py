@@ -0,0 +1,74 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import random
+import pandas as pd
+
+POSITIVE = ["great", "wonderful", "loved", "amazing", "brilliant", "superb", "enjoyable", "masterpiece",
+            "touching", "beautiful", "funny", "excellent", "fantastic", "memorable", "perfect"]
+NEGATIVE = ["awful", "boring", "hated", "terrible", "worst", "waste", "dull", "poorly", "predictable",
+            "disappointing", "stupid", "mess", "horrible", "annoying", "pointless"]
+FILLER = ["the", "movie", "film", "plot", "acting", "actor", "actress", "story", "scene", "scenes", "director",
+          "character", "characters", "ending", "script", "was", "is", "it", "this", "and", "but", "really",
+          "quite", "very", "watched", "watching", "seen", "time", "first", "people", "think", "would", "could",
+          "don't", "didn't", "it's", "I've", "i", "you", "they", "one", "two", "cast", "music", "camera"]
+PUNCTUATION = [".", ",", "!", "?", "...", "<br /><br />", "(", ")", "\"", "-"]
+
+
+def generate_reviews(rows=10000, min_words=50, max_words=300, seed=15):
+    """
+    generates labelled IMDB like reviews, with html breaks, punctuation, contractions and
+    a few sentiment words mixed into filler text
+
+    Args:
+        rows (int, optional): number of reviews. Defaults to 10000.
+        min_words (int, optional): shortest review in words. Defaults to 50.
+        max_words (int, optional): longest review in words. Defaults to 300.
+        seed (int, optional): seed of the generator, the same seed gives the same reviews. Defaults to 15.
+
+    Returns:
+        pandas.DataFrame: "review" and "sentiment" columns
+    """
+    generator = random.Random(seed)
+    reviews = list()
+    labels = list()
+    for _ in range(rows):
+        label = generator.choice(("positive", "negative"))
+        own, other = (POSITIVE, NEGATIVE) if label == "positive" else (NEGATIVE, POSITIVE)
+        length = generator.randint(min_words, max_words)
+
+        words = list()
+        for _ in range(length):
+            draw = generator.random()
+            if draw < 0.08:
+                words.append(generator.choice(own))
+            elif draw < 0.10:
+                words.append(generator.choice(other))
+            elif draw < 0.22:
+                words.append(generator.choice(PUNCTUATION))
+            else:
+                words.append(generator.choice(FILLER))
+        words[0] = words[0].capitalize()
+        reviews.append(" ".join(words))
+        labels.append(label)
+
+    return pd.DataFrame({"review": reviews, "sentiment": labels})
@@ -0,0 +1,170 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# importing custom packages
+from Logging.logger import Logging
+
+
+class CleanedReviewCache:
+    """
+    Persistent sqlite cache mapping the hash of a raw review to its cleaned text,
+    so retraining only cleans the reviews that were not seen before
+
+    Keyword arguments:
+        cache_path="Cleaned_Csv_Files/cleaned_cache.sqlite3",
+        max_bytes=512 MB,
+        namespace="",
+        log_folder_name="Training_Logs",
+        log_file_name="2-data_cleaner.txt"
+
+    argument --
+        cache_path: path of the sqlite file.
+        max_bytes: size of the cleaned text kept, the least recently used reviews are evicted above it.
+        namespace: mixed into every key, use Cleaner.fingerprint() so a changed cleaner never reads old entries.
+        log_folder_name: Specifies the folder for Training Logs.
+        log_file_name: Specifies the name of the log file.
+
+    Return: None
+    """
+
+    _batch = 500  # keys per "IN (...)" query, below sqlite's variable limit
+
+    def __init__(self, cache_path=os.path.join("Cleaned_Csv_Files", "cleaned_cache.sqlite3"), max_bytes=512 * 1024 * 1024,
+                 namespace="", log_folder_name="Training_Logs", log_file_name="2-data_cleaner.txt"):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.namespace = namespace.encode("utf-8")
+        self.log = Logging(os.path.join(log_folder_name, log_file_name))
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(cache_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS cleaned (
+                                        key BLOB PRIMARY KEY,
+                                        cleaned TEXT NOT NULL,
+                                        size INTEGER NOT NULL,
+                                        used INTEGER NOT NULL)""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS cleaned_used ON cleaned (used)")
+        self._connection.commit()
+
+    def __repr__(self):
+        return f"CleanedReviewCache({self.cache_path})"
+
+    def key(self, review):
+        """
+        returns the cache key of a raw review
+
+        Args:
+            review (str): raw review
+
+        Returns:
+            bytes: sha1 digest of the namespace and the review
+        """
+        return hashlib.sha1(self.namespace + review.encode("utf-8")).digest()
+
+    def get_many(self, keys):
+        """
+        looks up many keys at once and marks the hits as recently used
+
+        Args:
+            keys (list): keys made by CleanedReviewCache.key
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            dict: key -> cleaned review, only for the keys present in the cache
+        """
+        try:
+            found = dict()
+            now = time.time_ns()
+            with self._lock:
+                for i in range(0, len(keys), self._batch):
+                    batch = keys[i:i + self._batch]
+                    marks = ",".join("?" * len(batch))
+                    found.update(self._connection.execute(
+                        f"SELECT key, cleaned FROM cleaned WHERE key IN ({marks})", batch))
+                    self._connection.execute(
+                        f"UPDATE cleaned SET used = ? WHERE key IN ({marks})", [now, *batch])
+                self._connection.commit()
+            return found
+
+        except Exception as e:
+            self.log.error(f"function get_many: {e}")
+            raise Exception(e)
+
+    def put_many(self, items):
+        """
+        stores many (key, cleaned review) pairs and evicts the least recently used ones above max_bytes
+
+        Args:
+            items (iterable): (key, cleaned review) pairs
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+        """
+        try:
+            now = time.time_ns()
+            rows = [(key, cleaned, len(cleaned), now) for key, cleaned in items]
+            with self._lock:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO cleaned (key, cleaned, size, used) VALUES (?, ?, ?, ?)", rows)
+                self._evict()
+                self._connection.commit()
+
+        except Exception as e:
+            self.log.error(f"function put_many: {e}")
+            raise Exception(e)
+
+    def _evict(self):
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM cleaned").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+
+        freed = 0
+        evicted = list()
+        for key, size in self._connection.execute("SELECT key, size FROM cleaned ORDER BY used"):
+            evicted.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._connection.executemany("DELETE FROM cleaned WHERE key = ?", evicted)
+        self.log.info(f"Evicted {len(evicted)} reviews ({freed} bytes) from the cleaning cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM cleaned").fetchone()[0]
+
+    def close(self):
+        """closes the sqlite connection"""
+        with self._lock:
+            self._connection.close()
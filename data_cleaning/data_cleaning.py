@@ -20,12 +20,20 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 import os
+import math
 import nltk
 import string
+import hashlib
+import threading
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from nltk.stem import PorterStemmer
 from nltk.corpus import stopwords
 from Logging.logger import Logging
+from instrumentation.metrics import timed
 # nltk.download()  To download all the nltk libraries
 
 
@@ -33,23 +41,34 @@ class Cleaner:
     """
     Class to clean the data , perform stemming and preparing the data for cleaning
 
-    Keyword arguments: log_folder_name="Training_Logs", log_file_name="2-data_cleaner.txt"
+    Keyword arguments: log_folder_name="Training_Logs", log_file_name="2-data_cleaner.txt", stem_cache_size=100000
 
     argument -- 
         log_folder_name: Specifies the folder for Training Logs
         log_file_name: Specifies the name of the log file
+        stem_cache_size: Number of stemmed words remembered, None for no limit
 
     Return: None
     """
 
-    def __init__(self, log_folder_name="Training_Logs", log_file_name="2-data_cleaner.txt"):
+    def __init__(self, log_folder_name="Training_Logs", log_file_name="2-data_cleaner.txt", stem_cache_size=100000):
         self.stemmer = PorterStemmer()
-        self.stop_words = stopwords.words('english')
-        self.unnecessary_words = ["br", "'ll",
-                                  "..", "....", "n't", "...", " ... "]
+        self.stop_words = frozenset(stopwords.words('english'))
+        self.unnecessary_words = frozenset(["br", "'ll",
+                                            "..", "....", "n't", "...", " ... "])
         self.punctuation = string.punctuation
+        self.log_folder_name = log_folder_name
+        self.log_file_name = log_file_name
+        self.stem_cache_size = stem_cache_size
         self.log = Logging(os.path.join(log_folder_name, log_file_name))
 
+        # words dropped before stemming and the table deleting every punctuation letter
+        self._skip_words = self.stop_words | self.unnecessary_words
+        self._punctuation_table = str.maketrans("", "", self.punctuation)
+        # the same word is stemmed again and again, remember the recent ones
+        self._stem = lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
+        self.stem_table = None
+
     def review_to_words(self, sentence):
         """
         Converts a sentence into a clean and stemmed sentence
@@ -64,32 +83,168 @@ class Cleaner:
             String : Cleaned Sentence
         """
         try:
-            words = nltk.word_tokenize(sentence)
+            skip_words = self._skip_words
+            punctuation_table = self._punctuation_table
+            stem = self._stem
             words_list = list()
-            for word in words:
+            for word in nltk.word_tokenize(sentence):
                 word = word.lower()
-                letter_list = list()
-                # print(word)
-                if word not in self.stop_words:
-                    if word not in self.unnecessary_words:
-                        for letter in word:
-                            if letter not in self.punctuation:
-                                letter_list.append(letter)
-                        if letter_list:
-                            word = ''.join(letter_list)
-                            words_list.append(self.stemmer.stem(word))
+                if word in skip_words:
+                    continue
+                word = word.translate(punctuation_table)
+                if word:
+                    words_list.append(stem(word))
             return " ".join(words_list)
 
         except Exception as e:
             self.log.error(f"function review_to_words: {e}")
             raise Exception(e)
 
-    def ret_cleaned_dataframe(self, dataframe, col_num=0):
+    def build_stem_table(self, sentences, keep=None):
+        """
+        returns a surface word -> stem table of the words of the sentences, the words are found with one arrow
+        regex pass instead of the nltk tokenizer and every distinct word is stemmed once
+
+        Args:
+            sentences (pandas.Series/list): raw sentences, for example the training reviews
+            keep (set, optional): stems worth a table entry, for example the words of the vectorizer vocabulary.
+                Defaults to None: every stem.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            dict: surface word -> stem
+        """
+        try:
+            sentences = pa.array(sentences, type=pa.string(), from_pandas=True)
+            words = pc.unique(pc.split_pattern_regex(pc.utf8_lower(sentences), r"[^\w']+").flatten()).to_pylist()
+
+            skip_words = self._skip_words
+            punctuation_table = self._punctuation_table
+            stem = self.stemmer.stem
+            stem_table = dict()
+            for word in words:
+                if not word or word in skip_words:
+                    continue
+                word = word.translate(punctuation_table)
+                if word and word not in stem_table:
+                    stemmed = stem(word)
+                    if keep is None or stemmed in keep:
+                        stem_table[word] = stemmed
+            self.log.info(f"Stem table of {len(stem_table)} words built from {len(words)} distinct words Successfully!!")
+            return stem_table
+
+        except Exception as e:
+            self.log.error(f"function build_stem_table: {e}")
+            raise Exception(e)
+
+    def set_stem_table(self, stem_table):
+        """
+        makes review_to_words look the words up in a surface word -> stem table, the stemmer (memoized) is only
+        called for the words missing from it
+
+        Args:
+            stem_table (dict): output of build_stem_table, None to go back to the stemmer only
+
+        Returns:
+            None
+        """
+        fallback = lru_cache(maxsize=self.stem_cache_size)(self.stemmer.stem)
+        if stem_table is None:
+            self._stem = fallback
+        else:
+            table = _StemTable(stem_table)
+            table.fallback = fallback
+            self._stem = table.__getitem__
+        self.stem_table = stem_table
+        self.log.info(f"Stem table of {len(stem_table or ())} words set Successfully!!")
+
+    def fingerprint(self):
+        """
+        returns a short hash of everything that changes the cleaned output,
+        used as the namespace of the CleanedReviewCache
+
+        Returns:
+            str: hex digest
+        """
+        config = "|".join([type(self.stemmer).__name__, *sorted(self._skip_words), self.punctuation])
+        return hashlib.sha1(config.encode("utf-8")).hexdigest()[:16]
+
+    @timed("cleaner.clean_series")
+    def clean_series(self, series, n_jobs=1, chunksize=None, cache=None):
+        """Cleans every sentence of a series, optionally sharding it across a process pool
+
+        Args:
+            series (pandas.Series): sentences to be cleaned
+            n_jobs (int, optional): Number of worker processes, -1 uses every core. Defaults to 1.
+            chunksize (int, optional): Sentences sent to a worker at a time. Defaults to None: picked from the size.
+            cache (CleanedReviewCache, optional): only the sentences missing from the cache are cleaned. Defaults to None.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            pandas.Series: cleaned sentences with the original index and order
+        """
+        try:
+            if cache is not None:
+                return self._clean_series_cached(series, n_jobs, chunksize, cache)
+
+            n_jobs = _effective_n_jobs(n_jobs)
+            if n_jobs == 1 or len(series) < 2:
+                return series.apply(self.review_to_words)
+
+            sentences = series.tolist()
+            if not chunksize:
+                # a few chunks per worker keeps them all busy till the end
+                chunksize = max(1, math.ceil(len(sentences) / (n_jobs * 4)))
+            chunks = [sentences[i:i + chunksize] for i in range(0, len(sentences), chunksize)]
+            self.log.info(f"Cleaning {len(sentences)} sentences in {len(chunks)} chunks on {n_jobs} processes")
+
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(self.log_folder_name, self.log_file_name, self.stem_cache_size,
+                                               self.stem_table)) as executor:
+                cleaned = list()
+                # map returns the chunks in submission order
+                for cleaned_chunk in executor.map(_clean_chunk, chunks):
+                    cleaned.extend(cleaned_chunk)
+
+            return pd.Series(cleaned, index=series.index, name=series.name)
+
+        except Exception as e:
+            self.log.error(f"function clean_series: {e}")
+            raise Exception(e)
+
+    def _clean_series_cached(self, series, n_jobs, chunksize, cache):
+        keys = [cache.key(sentence) for sentence in series]
+        cleaned = cache.get_many(list(set(keys)))
+
+        # every missing review is cleaned once, even if it appears many times
+        missing = dict()
+        for key, sentence in zip(keys, series):
+            if key not in cleaned and key not in missing:
+                missing[key] = sentence
+        self.log.info(f"Cleaning cache: {len(series) - len(missing)} hits, {len(missing)} reviews to clean")
+
+        if missing:
+            new_cleaned = self.clean_series(pd.Series(list(missing.values())), n_jobs=n_jobs, chunksize=chunksize)
+            new_items = list(zip(missing.keys(), new_cleaned.tolist()))
+            cache.put_many(new_items)
+            cleaned.update(new_items)
+
+        return pd.Series([cleaned[key] for key in keys], index=series.index, name=series.name)
+
+    @timed("cleaner.ret_cleaned_dataframe")
+    def ret_cleaned_dataframe(self, dataframe, col_num=0, n_jobs=1, chunksize=None, cache=None):
         """Returns a cleaned dataframe
 
         Args:
             dataframe (pandas.DataFrame): DataFrame to be Cleaned
             col_num (int, optional): Number of the column to be cleaned. Defaults to 0.
+            n_jobs (int, optional): Number of worker processes, -1 uses every core. Defaults to 1.
+            chunksize (int, optional): Rows sent to a worker at a time. Defaults to None: picked from the size.
+            cache (CleanedReviewCache, optional): only the rows missing from the cache are cleaned. Defaults to None.
 
         Raises:
             Exception: any Exception, check logs for specifics
@@ -101,8 +256,8 @@ class Cleaner:
             col = dataframe.columns
             self.log.info(
                 f"Columns extracted, cleaning column '{col[col_num]}' for processing!")
-            dataframe[col[col_num]] = dataframe[col[col_num]].apply(
-                self.review_to_words)
+            dataframe[col[col_num]] = self.clean_series(
+                dataframe[col[col_num]], n_jobs=n_jobs, chunksize=chunksize, cache=cache)
             # dataframe[col[col_num+1]] = dataframe[col[col_num+1]].apply(lambda x: 1 if x == "positive" else 0)
             self.log.info(f"Column '{col[col_num]}' Cleaned Successfully!")
             return dataframe
@@ -127,3 +282,84 @@ class Cleaner:
         except Exception as e:
             self.log.error(f"function save_dataframe_in_csv: {e}")
             raise Exception(e)
+
+    @timed("cleaner.save_dataframe")
+    def save_dataframe(self, dataframe, file_path, file_format="feather"):
+        """saves the dataframe in a columnar format, which is much faster to write and read back than csv
+
+        Args:
+            dataframe (pandas.DataFrame): DataFrame to be saved
+            file_path (string/path): path to save the dataframe
+            file_format (str, optional): one of "feather", "parquet" or "csv". Defaults to "feather".
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+        """
+        try:
+            # written under a temporary name so readers never see a half written file
+            part_path = file_path + ".part"
+            if file_format == "feather":
+                # feather only stores a default index
+                dataframe.reset_index(drop=True).to_feather(part_path)
+            elif file_format == "parquet":
+                dataframe.to_parquet(part_path, index=False)
+            elif file_format == "csv":
+                dataframe.to_csv(part_path, index_label=False)
+            else:
+                raise ValueError(f"unknown file_format '{file_format}'")
+            os.replace(part_path, file_path)
+            self.log.info(f"DataFrame saved as {file_format} at {file_path} Successfully!!")
+        except Exception as e:
+            self.log.error(f"function save_dataframe: {e}")
+            raise Exception(e)
+
+    def save_dataframe_in_background(self, dataframe, file_path, file_format="feather"):
+        """saves the dataframe from a background thread, see save_dataframe
+
+        Args:
+            dataframe (pandas.DataFrame): DataFrame to be saved, it must not be modified until the thread finishes
+            file_path (string/path): path to save the dataframe
+            file_format (str, optional): one of "feather", "parquet" or "csv". Defaults to "feather".
+
+        Returns:
+            threading.Thread: the started thread, join it to wait for the file
+        """
+        thread = threading.Thread(target=self.save_dataframe, args=(dataframe, file_path, file_format),
+                                  name="save-cleaned-dataframe")
+        thread.start()
+        self.log.info(f"Saving DataFrame at {file_path} in the background")
+        return thread
+
+
+def _effective_n_jobs(n_jobs):
+    # same convention as joblib: -1 is every core, -2 every core but one
+    cpu_count = os.cpu_count() or 1
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, cpu_count + 1 + n_jobs)
+    return n_jobs
+
+
+class _StemTable(dict):
+    # a plain dict lookup for the known words, the stemmer for the others, which are not added
+    __slots__ = ("fallback",)
+
+    def __missing__(self, word):
+        return self.fallback(word)
+
+
+# every worker process builds its own Cleaner (stemmer, stopwords) once, with the stem table of the parent
+_worker_cleaner = None
+
+
+def _init_worker(log_folder_name, log_file_name, stem_cache_size, stem_table=None):
+    global _worker_cleaner
+    _worker_cleaner = Cleaner(log_folder_name, log_file_name, stem_cache_size)
+    if stem_table is not None:
+        _worker_cleaner.set_stem_table(stem_table)
+
+
+def _clean_chunk(sentences):
+    review_to_words = _worker_cleaner.review_to_words
+    return [review_to_words(sentence) for sentence in sentences]
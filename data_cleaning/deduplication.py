@@ -0,0 +1,242 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+# importing custom packages
+from Logging.logger import Logging
+from instrumentation.metrics import timed
+
+MAX_HASH = np.uint32(0xFFFFFFFF)
+
+
+class Deduplicator:
+    """
+    Collapses exact and near duplicate cleaned reviews before vectorizing, so duplicates neither waste fit time
+    nor land on both sides of the train/test split. Exact duplicates are found by hashing the cleaned text, near
+    duplicates by MinHash signatures of the token sets bucketed with LSH bands; every candidate pair is checked
+    against the estimated Jaccard similarity and the pairs are merged into clusters, one row of each is kept.
+    Every step is a hash, a sort or a vectorized pass, so the time grows roughly linearly with the rows.
+
+    Keyword arguments:
+        threshold=0.8,
+        num_perm=64,
+        bands=8,
+        min_tokens=5,
+        chunk_tokens=2000000,
+        drop_conflicts=False,
+        seed=15,
+        log_folder_name="Training_Logs",
+        log_file_name="2-data_cleaner.txt"
+
+    argument --
+        threshold: estimated Jaccard similarity of the token sets above which two reviews are duplicates.
+        num_perm: length of the MinHash signatures, more is more accurate and slower.
+        bands: number of LSH bands, num_perm / bands rows each, more bands find less similar candidates.
+        min_tokens: reviews with fewer tokens are only collapsed with exact duplicates, tiny token sets are too
+            often equal by chance.
+        chunk_tokens: tokens hashed at a time, bounds the memory of the signature step.
+        drop_conflicts: Whether to drop every row of a cluster whose rows carry different labels.
+        seed: seed of the hash functions.
+        log_folder_name: Specifies the folder for Training Logs.
+        log_file_name: Specifies the name of the log file.
+
+    Return: None
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=8, min_tokens=5, chunk_tokens=2000000, drop_conflicts=False, seed=15,
+                 log_folder_name="Training_Logs", log_file_name="2-data_cleaner.txt"):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.min_tokens = min_tokens
+        self.chunk_tokens = chunk_tokens
+        self.drop_conflicts = drop_conflicts
+        self.seed = seed
+        self.log = Logging(os.path.join(log_folder_name, log_file_name))
+        self.report = None
+
+        rng = np.random.default_rng(seed)
+        # multiply-shift hashing: (a * x + b) >> 32 with odd a, one (a, b) per permutation
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._band_weights = rng.integers(1, 2 ** 63, size=num_perm // bands, dtype=np.uint64) | np.uint64(1)
+
+    def __repr__(self):
+        return f"Deduplicator(threshold={self.threshold}, num_perm={self.num_perm}, bands={self.bands})"
+
+    def signatures(self, texts, return_lengths=False):
+        """
+        returns the MinHash signature of the whitespace separated token set of every text
+
+        Args:
+            texts (array like): cleaned reviews.
+            return_lengths (bool, optional): Whether to also return the number of tokens of every text. Defaults to False.
+
+        Returns:
+            numpy.ndarray: uint32 matrix, one row per text and one column per permutation
+            (numpy.ndarray, numpy.ndarray): signatures and number of tokens, if return_lengths
+        """
+        texts = pa.array(texts, type=pa.string(), from_pandas=True)
+        if isinstance(texts, pa.ChunkedArray):
+            texts = texts.combine_chunks()
+        tokens = pc.utf8_split_whitespace(texts)
+        offsets = tokens.offsets.to_numpy().astype(np.int64)
+        # token ids from arrow's hash table, no python string per token
+        encoded = pc.dictionary_encode(tokens.flatten())
+        token_ids = encoded.indices.to_numpy(zero_copy_only=False)
+        # one random 64 bit value per distinct token, the permutations are applied to it
+        token_hashes = np.random.default_rng(self.seed).integers(0, 2 ** 63, size=len(encoded.dictionary),
+                                                                 dtype=np.uint64)
+
+        n_rows = len(offsets) - 1
+        chunks = []
+        row = 0
+        while row < n_rows:
+            # as many rows as fit in chunk_tokens, at least one
+            end = int(np.searchsorted(offsets, offsets[row] + self.chunk_tokens, side="right")) - 1
+            end = min(max(end, row + 1), n_rows)
+            filled = np.flatnonzero(offsets[row + 1:end + 1] - offsets[row:end])
+            if len(filled):
+                chunks.append((row + filled, offsets[row + filled] - offsets[row], offsets[row], offsets[end]))
+            row = end
+
+        # empty texts keep the maximum in every column
+        signatures = np.full((self.num_perm, n_rows), MAX_HASH, dtype=np.uint32)
+        for perm in range(self.num_perm):
+            # the permutation is applied once per distinct token, then gathered for every occurrence
+            table = ((self._a[perm] * token_hashes + self._b[perm]) >> np.uint64(32)).astype(np.uint32)
+            for rows, segments, low, high in chunks:
+                signatures[perm, rows] = np.minimum.reduceat(table[token_ids[low:high]], segments)
+        signatures = np.ascontiguousarray(signatures.T)
+        return (signatures, np.diff(offsets)) if return_lengths else signatures
+
+    def clusters(self, signatures, eligible=None):
+        """
+        returns the near duplicate cluster of every signature
+
+        Args:
+            signatures (numpy.ndarray): output of signatures.
+            eligible (numpy.ndarray, optional): boolean mask of the rows that may be merged. Defaults to None: every row.
+
+        Returns:
+            numpy.ndarray: cluster id of every row, equal ids are duplicates
+        """
+        n_rows = len(signatures)
+        rows_per_band = self.num_perm // self.bands
+        sources, targets = [], []
+        for band in range(self.bands):
+            block = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+            keys = block @ self._band_weights  # wraps around, collisions are removed by the check below
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            new_bucket = np.empty(n_rows, dtype=bool)
+            new_bucket[:1] = True
+            np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=new_bucket[1:])
+            # every row of a bucket is paired with the first row of the bucket
+            leaders = order[np.maximum.accumulate(np.where(new_bucket, np.arange(n_rows), 0))]
+            members = ~new_bucket
+            sources.append(order[members])
+            targets.append(leaders[members])
+
+        sources = np.concatenate(sources)
+        targets = np.concatenate(targets)
+        if eligible is not None:
+            both = eligible[sources] & eligible[targets]
+            sources, targets = sources[both], targets[both]
+        if len(sources):
+            # the share of equal signature entries estimates the Jaccard similarity of the pair
+            similar = np.empty(len(sources), dtype=bool)
+            step = max(1, self.chunk_tokens // self.num_perm)
+            for start in range(0, len(sources), step):
+                part = slice(start, start + step)
+                agreement = (signatures[sources[part]] == signatures[targets[part]]).mean(axis=1)
+                similar[part] = agreement >= self.threshold
+            sources, targets = sources[similar], targets[similar]
+
+        graph = sp.coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(n_rows, n_rows))
+        _, labels = connected_components(graph, directed=False)
+        return labels
+
+    @timed("cleaner.deduplicate")
+    def deduplicate(self, dataframe, col_num=0, label_col=None):
+        """
+        returns the DataFrame with one row per duplicate cluster, the first row of every cluster is kept,
+        the counts are kept in self.report
+
+        Args:
+            dataframe (pandas.DataFrame): cleaned DataFrame.
+            col_num (int, optional): Number of the cleaned review column. Defaults to 0.
+            label_col (str, optional): name of the label column, used to count clusters with conflicting labels. Defaults to None.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            pandas.DataFrame: deduplicated DataFrame, the index of the kept rows is unchanged
+        """
+        try:
+            start = time.perf_counter()
+            texts = dataframe[dataframe.columns[col_num]]
+
+            # exact duplicates: equal text, equal hash
+            codes, _ = pd.factorize(pd.util.hash_pandas_object(texts, index=False).to_numpy())
+            first_rows = np.flatnonzero(~pd.Series(codes).duplicated().to_numpy())
+            exact_duplicates = len(texts) - len(first_rows)
+
+            # near duplicates among the distinct texts, which are in order of first appearance like the codes
+            signatures, lengths = self.signatures(texts.iloc[first_rows], return_lengths=True)
+            labels = self.clusters(signatures, eligible=lengths >= self.min_tokens)
+            row_clusters = labels[codes]
+            keep = ~pd.Series(row_clusters).duplicated().to_numpy()
+            near_duplicates = len(first_rows) - int(np.count_nonzero(~pd.Series(labels).duplicated().to_numpy()))
+
+            conflicts = 0
+            if label_col is not None:
+                label_counts = pd.Series(dataframe[label_col].to_numpy()).groupby(row_clusters).nunique()
+                conflicting = label_counts.index[label_counts.to_numpy() > 1].to_numpy()
+                conflicts = len(conflicting)
+                if self.drop_conflicts and conflicts:
+                    keep &= ~np.isin(row_clusters, conflicting)
+
+            result = dataframe[keep]
+            self.report = {"rows": len(dataframe), "exact_duplicates": exact_duplicates,
+                           "near_duplicates": near_duplicates, "conflicting_clusters": conflicts,
+                           "rows_kept": len(result), "rows_collapsed": len(dataframe) - len(result),
+                           "seconds": time.perf_counter() - start}
+            self.log.info(f"Deduplicated {len(dataframe)} rows Successfully!! {exact_duplicates} exact and "
+                          f"{near_duplicates} near duplicates, {conflicts} clusters with conflicting labels, "
+                          f"{len(result)} rows kept")
+            return result
+
+        except Exception as e:
+            self.log.error(f"function deduplicate: {e}")
+            raise Exception(e)
@@ -21,13 +21,27 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 #importing libraries
 import os
+import time
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
 from Logging.logger import Logging
+from instrumentation.metrics import timed
+
+
+# file extensions understood by ret_dataset, the compression extension is stripped first
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl", ".parquet": "parquet", ".pq": "parquet"}
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd", ".zstd": "zstd", ".bz2": "bz2"}
+# arrow strings stay arrow backed in pandas instead of becoming one python object per review
+STRING_TYPES = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
 
 
 class DataInput:
     """    
-    Class to take input of CSV files for training and prediction
+    Class to take input of CSV, JSONL and Parquet files for training and prediction
     
     Keyword arguments: log_folder_name="Training_Logs", log_file_name="1-file_input.txt"
     
@@ -40,7 +54,9 @@ class DataInput:
 
     def __init__(self, log_folder_name="Training_Logs", log_file_name="1-file_input.txt"):
         self.log = Logging(os.path.join(log_folder_name, log_file_name))
+        self.report = None
 
+    @timed("data_input.ret_dataframe")
     def ret_dataframe(self, file_path:"str", rows:"int"=None, drop_null:"bool"=True) -> "pd.DataFrame":
         """
         returns a DataFrame after reading data from a given CSV file
@@ -83,6 +99,168 @@ class DataInput:
             self.log.error(e)
             raise Exception(f"function ret_dataframe: {e}")
 
+    def ret_dataframe_chunks(self, file_path:"str", chunksize:"int"=10000, drop_null:"bool"=True):
+        """
+        yields DataFrames of at most chunksize rows from a given CSV file, so the whole file is never in memory
+        
+        Args:
+            file_path -> str/path : path of the CSV file.
+            chunksize (int, optional): number of rows in every chunk. Defaults to 10000.
+            drop_null (bool, optional): Whether to drop the rows with null values from every chunk. Defaults to True.
+
+        Raises:
+            OSError: path not correct
+            Exception: any other Exception
+
+        Yields:
+            pandas.DataFrame: pandas DataFrame
+        """
+        try:
+            rows = 0
+            dropped = 0
+            with pd.read_csv(file_path, chunksize=chunksize) as reader:
+                self.log.info(f"Reading {file_path} in chunks of {chunksize} rows!")
+                for df in reader:
+                    if drop_null:
+                        before = len(df)
+                        df = df.dropna()
+                        dropped += before - len(df)
+                    rows += len(df)
+                    yield df
+
+            self.log.info(f"Read {rows} rows in chunks, {dropped} rows with Null Values Dropped!")
+
+        except OSError as e:
+            self.log.error(f"File Not Found!! function ret_dataframe_chunks: {e}")
+            raise OSError(e)
+
+        except Exception as e:
+            self.log.error(e)
+            raise Exception(f"function ret_dataframe_chunks: {e}")
+
+    @timed("data_input.ret_dataset")
+    def ret_dataset(self, file_path:"str", review_col:"str"="review", label_col:"str"=None, labels:"list"=None,
+                    file_format:"str"=None, rows:"int"=None, drop_bad:"bool"=True) -> "pd.DataFrame":
+        """
+        returns a DataFrame of the review column and the label column of a CSV, JSONL or Parquet file, CSV and JSONL
+        may be gzip, zstd or bz2 compressed. Only the declared columns are parsed, the reviews stay arrow backed strings
+        and the labels are categorical. Bad rows (missing or empty review, missing or unknown label) are counted and
+        dropped on the arrow table before pandas sees it, the counts are kept in self.report.
+
+        Args:
+            file_path -> str/path : path of the file, the format and compression are taken from the extension.
+            review_col (str, optional): name of the review column. Defaults to "review".
+            label_col (str, optional): name of the label column. Defaults to None: no labels (prediction input).
+            labels (list, optional): allowed labels, the other labels are bad rows. Defaults to None: any label.
+            file_format (str, optional): "csv", "jsonl" or "parquet". Defaults to None: taken from the extension.
+            rows (int, optional): numbers of rows to read. Defaults to None: reads all rows.
+            drop_bad (bool, optional): Whether to drop the bad rows or only count them. Defaults to True.
+
+        Raises:
+            OSError: path not correct
+            Exception: any other Exception, for example a missing column
+
+        Returns:
+            pandas.DataFrame: review column first, then the label column
+        """
+        try:
+            start = time.perf_counter()
+            columns = [review_col] + ([label_col] if label_col else [])
+            file_format, compression = self._detect_format(file_path, file_format)
+            table = self._read_table(file_path, file_format, compression, columns, rows)
+            rows_read = table.num_rows
+
+            review = table.column(review_col)
+            bad = {"missing_review": pc.is_null(review),
+                   "empty_review": pc.fill_null(pc.equal(pc.utf8_length(review), 0), False)}
+            if label_col:
+                label = table.column(label_col)
+                bad["missing_label"] = pc.is_null(label)
+                if labels is not None:
+                    bad["unknown_label"] = pc.and_(pc.is_valid(label),
+                                                   pc.invert(pc.is_in(label, value_set=pa.array(labels))))
+            bad_mask = bad["missing_review"]
+            for mask in bad.values():
+                bad_mask = pc.or_(bad_mask, mask)
+
+            bad_rows = pc.sum(bad_mask).as_py() or 0
+            if drop_bad and bad_rows:
+                table = table.filter(pc.invert(bad_mask))
+            if label_col:
+                table = table.set_column(1, label_col, table.column(label_col).dictionary_encode())
+
+            df = table.to_pandas(types_mapper=STRING_TYPES.get, self_destruct=True)
+            if label_col and labels is not None:
+                # every label is declared, so the categories do not depend on which rows were read
+                df[label_col] = df[label_col].cat.set_categories(list(labels))
+            del table
+
+            self.report = {"file_path": str(file_path), "format": file_format, "compression": compression,
+                           "rows_read": rows_read, "rows": len(df), "bad_rows": bad_rows,
+                           "bad_reasons": {reason: pc.sum(mask).as_py() or 0 for reason, mask in bad.items()},
+                           "first_bad_rows": pc.indices_nonzero(bad_mask).slice(0, 10).to_pylist(),
+                           "seconds": time.perf_counter() - start}
+            self.log.info(f"Dataset {file_path} loaded successfully! {rows_read} rows read, {bad_rows} bad rows "
+                          f"{'dropped' if drop_bad else 'kept'}: {self.report['bad_reasons']}")
+            return df
+
+        except OSError as e:
+            self.log.error(f"File Not Found!! function ret_dataset: {e}")
+            raise OSError(e)
+
+        except Exception as e:
+            self.log.error(e)
+            raise Exception(f"function ret_dataset: {e}")
+
+    @staticmethod
+    def _detect_format(file_path, file_format=None):
+        root, extension = os.path.splitext(str(file_path).lower())
+        compression = COMPRESSIONS.get(extension)
+        if compression:
+            root, extension = os.path.splitext(root)
+        file_format = file_format or FORMATS.get(extension)
+        if file_format not in ("csv", "jsonl", "parquet"):
+            raise ValueError(f"unknown file format of {file_path}, pass file_format='csv', 'jsonl' or 'parquet'")
+        if file_format == "parquet" and compression:
+            raise ValueError("parquet files are compressed internally, they cannot be read through a compressed stream")
+        return file_format, compression
+
+    @staticmethod
+    def _read_table(file_path, file_format, compression, columns, rows=None):
+        stream = None
+        if file_format == "parquet":
+            parquet = pq.ParquetFile(file_path)
+            if rows is None:
+                return parquet.read(columns=columns)
+            batches = parquet.iter_batches(columns=columns)
+            schema = parquet.schema_arrow
+            schema = pa.schema([schema.field(column) for column in columns])
+        else:
+            stream = pa.input_stream(file_path, compression=compression)
+            schema = pa.schema([(column, pa.string()) for column in columns])
+            if file_format == "jsonl":
+                # fields outside the schema are skipped by the parser, so unused columns are never built
+                with stream:
+                    table = pa_json.read_json(stream, parse_options=pa_json.ParseOptions(
+                        explicit_schema=schema, unexpected_field_behavior="ignore"))
+                return table if rows is None else table.slice(0, rows)
+            batches = pa_csv.open_csv(stream, convert_options=pa_csv.ConvertOptions(
+                include_columns=columns, column_types=schema, strings_can_be_null=True))
+
+        # read batch by batch so a row limit stops reading early
+        kept = []
+        read = 0
+        try:
+            for batch in batches:
+                kept.append(batch)
+                read += batch.num_rows
+                if rows is not None and read >= rows:
+                    break
+        finally:
+            if stream is not None:
+                stream.close()
+        table = pa.Table.from_batches(kept, schema=schema)
+        return table if rows is None else table.slice(0, rows)
 
 if __name__ == "__main__":
     file = DataInput("..\IMDB Dataset.csv", "..\Training_Logs")
@@ -1,14 +1,13 @@
 import os
 import yagmail
 from dotenv import load_dotenv
+from email_yagmail.mail_queue import get_mail_queue
 
 load_dotenv()
 user_name = os.getenv('EMAIL') #email of the gmail account you want to send emails from
 password = os.getenv('PASSWORD')
 
-def email_send(to,message):
-  
-  html = """\
+THANK_YOU_HTML = """\
   <html>
     <body>
       <h1>Thank you for contacting me<h1>
@@ -19,6 +18,10 @@ def email_send(to,message):
       <a href="https://www.linkedin.com/in/rishabh-kalra-87ab151b2/">Linkedin Profile</a></p>
     </body>
   </html>"""
+
+def email_send(to,message):
+  
+  html = THANK_YOU_HTML
   
   yag = yagmail.SMTP(user_name,password)
   yag.send(
@@ -30,4 +33,13 @@ def email_send(to,message):
       to=os.getenv("TO"), 
       subject=f"Query by {to}",
       contents = message
-  )  #to = your personal email id on which you want to recieve customer queries
\ No newline at end of file
+  )  #to = your personal email id on which you want to recieve customer queries
+
+def email_send_async(to,message):
+  """queues both emails on the background mail queue and returns at once, False if the query could not be queued"""
+  mail_queue = get_mail_queue()
+  #the query goes first, the customer is only thanked once it is sure to reach us
+  if not mail_queue.enqueue(os.getenv("TO"), f"Query by {to}", message):
+    return False
+  mail_queue.enqueue(to, "Query Regarding IMDB Review Analysis", THANK_YOU_HTML)
+  return True
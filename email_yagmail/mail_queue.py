@@ -0,0 +1,261 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import os
+import time
+import queue
+import atexit
+import threading
+import yagmail
+
+# importing custom packages
+from Logging.logger import Logging
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class MailQueue:
+    """
+    Class to send emails from a background thread over one reused SMTP connection,
+    so the request that queues a mail returns at once instead of waiting on the SMTP handshake
+
+    Keyword arguments:
+        user=None,
+        password=None,
+        host=None,
+        port=None,
+        smtp_ssl=None,
+        smtp_starttls=None,
+        smtp_skip_login=None,
+        maxsize=100,
+        max_retries=3,
+        backoff=1.0,
+        idle_timeout=60.0,
+        log_folder_name="Prediction_Logs",
+        log_file_name="6-mail_queue.txt"
+
+    argument --
+        user: Email account the mails are sent from, defaults to the EMAIL environment variable.
+        password: Password of the account, defaults to the PASSWORD environment variable.
+        host: SMTP server, defaults to SMTP_HOST or smtp.gmail.com.
+        port: SMTP port, defaults to SMTP_PORT or the yagmail default.
+        smtp_ssl: Whether to connect over SSL, defaults to SMTP_SSL or True.
+        smtp_starttls: Whether to upgrade with STARTTLS, defaults to SMTP_STARTTLS or the yagmail default.
+        smtp_skip_login: Whether to skip the login, defaults to SMTP_SKIP_LOGIN or False (useful for a local test server).
+        maxsize: Maximum number of mails waiting to be sent, enqueue refuses new mails beyond it.
+        max_retries: Number of times a failed mail is retried before it is dropped.
+        backoff: Seconds waited before the first retry, doubled after every failure.
+        idle_timeout: Seconds without mails after which the SMTP connection is closed.
+        log_folder_name: Specifies the folder for the Logs.
+        log_file_name: Specifies the name of the log file.
+
+    Return: None
+    """
+
+    def __init__(self, user=None, password=None, host=None, port=None, smtp_ssl=None, smtp_starttls=None,
+                 smtp_skip_login=None, maxsize=100, max_retries=3, backoff=1.0, idle_timeout=60.0,
+                 log_folder_name="Prediction_Logs", log_file_name="6-mail_queue.txt"):
+        self.user = user if user is not None else os.getenv("EMAIL")
+        self.password = password if password is not None else os.getenv("PASSWORD")
+        self.host = host or os.getenv("SMTP_HOST") or "smtp.gmail.com"
+        self.port = port or os.getenv("SMTP_PORT") or None
+        self.smtp_ssl = smtp_ssl if smtp_ssl is not None else _env_flag("SMTP_SSL", True)
+        self.smtp_starttls = smtp_starttls if smtp_starttls is not None else _env_flag("SMTP_STARTTLS", None)
+        self.smtp_skip_login = smtp_skip_login if smtp_skip_login is not None \
+            else _env_flag("SMTP_SKIP_LOGIN", False)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.log = Logging(os.path.join(log_folder_name, log_file_name))
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._smtp = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return f"MailQueue({self.host}, {self._queue.qsize()} queued)"
+
+    def enqueue(self, to, subject, contents):
+        """
+        queues a mail to be sent by the background thread
+
+        Args:
+            to (str/list): receiver(s) of the mail.
+            subject (str): subject of the mail.
+            contents (str/list): body of the mail, html is allowed.
+
+        Returns:
+            bool: False if the queue is full and the mail was dropped, else True
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((to, subject, contents))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            self.log.warning(f"Mail queue full, dropped mail to {to}")
+            return False
+
+    def _ensure_worker(self):
+        # the worker is started lazily and once per process, so pre-forked workers get their own
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._smtp = None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+            self._thread.start()
+
+    def _connection(self):
+        if self._smtp is None:
+            self._smtp = yagmail.SMTP(self.user, self.password, host=self.host, port=self.port,
+                                      smtp_ssl=self.smtp_ssl, smtp_starttls=self.smtp_starttls,
+                                      smtp_skip_login=self.smtp_skip_login)
+        return self._smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _send(self, to, subject, contents):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._connection().send(to=to, subject=subject, contents=contents)
+                with self._lock:
+                    self.sent += 1
+                self.log.info(f"Mail to {to} sent Successfully!!")
+                return True
+            except Exception as e:
+                # the connection may be half dead after an error, the next attempt opens a fresh one
+                self._disconnect()
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self.failed += 1
+                    self.log.error(f"function _send: mail to {to} failed after {attempt + 1} attempts: {e}")
+                    return False
+                delay = self.backoff * (2 ** attempt)
+                self.log.warning(f"Mail to {to} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            try:
+                if item is None:
+                    return
+                self._send(*item)
+            finally:
+                self._queue.task_done()
+
+    def join(self, timeout=None):
+        """
+        waits until every queued mail has been handled
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. Defaults to None (no limit).
+
+        Returns:
+            bool: True if the queue was drained
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        """
+        returns the counters of the queue
+
+        Returns:
+            dict: queued, sent, failed and dropped mails
+        """
+        with self._lock:
+            return {"queued": self._queue.qsize(), "sent": self.sent,
+                    "failed": self.failed, "dropped": self.dropped}
+
+    def close(self, timeout=5.0):
+        """
+        sends the mails still queued (up to timeout seconds), stops the worker and closes the connection
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for the queue. Defaults to 5.0.
+
+        Returns:
+            None
+        """
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        self.join(timeout)
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        self._disconnect()
+
+
+_mail_queue = None
+_mail_queue_lock = threading.Lock()
+
+
+def get_mail_queue():
+    """
+    returns the process wide MailQueue, creating it on first use
+
+    Returns:
+        MailQueue: the shared mail queue
+    """
+    global _mail_queue
+    with _mail_queue_lock:
+        if _mail_queue is None:
+            _mail_queue = MailQueue(maxsize=int(os.getenv("MAIL_QUEUE_SIZE", 100)),
+                                    max_retries=int(os.getenv("MAIL_MAX_RETRIES", 3)))
+            atexit.register(_mail_queue.close)
+        return _mail_queue
+
+
+def close_mail_queue():
+    """sends the mails still queued and stops the process wide MailQueue, if it was ever created"""
+    if _mail_queue is not None:
+        _mail_queue.close()
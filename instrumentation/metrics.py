@@ -0,0 +1,228 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import os
+import time
+import bisect
+import threading
+import functools
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class StageMetrics:
+    """
+    Counters and latency histogram of one stage
+
+    Keyword arguments: window=2048
+
+    argument --
+        window: number of recent timings kept for the p50/p95/p99 quantiles
+
+    Return: None
+    """
+
+    def __init__(self, window=2048):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds, error=False):
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.recent.append(seconds)
+
+    def quantiles(self, quantiles=(0.5, 0.95, 0.99)):
+        if not self.recent:
+            return {q: 0.0 for q in quantiles}
+        values = np.quantile(np.fromiter(self.recent, dtype=np.float64), quantiles)
+        return dict(zip(quantiles, values.tolist()))
+
+
+class MetricsRegistry:
+    """
+    Collects the timing of every instrumented stage of the pipeline and exports it as Prometheus text
+
+    Keyword arguments: prefix="imdb"
+
+    argument --
+        prefix: prefix of every exported metric name
+
+    Return: None
+    """
+
+    def __init__(self, prefix="imdb"):
+        self.prefix = prefix
+        self._stages = dict()
+        self._lock = threading.Lock()
+        self._request = threading.local()
+
+    def __repr__(self):
+        return f"MetricsRegistry({len(self._stages)} stages)"
+
+    def observe(self, stage, seconds, error=False):
+        """
+        records one timing of a stage
+
+        Args:
+            stage (str): name of the stage, for example "cleaner.clean_series"
+            seconds (float): time spent in the stage
+            error (bool, optional): Whether the stage raised an exception. Defaults to False.
+        """
+        with self._lock:
+            metrics = self._stages.get(stage)
+            if metrics is None:
+                metrics = self._stages[stage] = StageMetrics()
+            metrics.observe(seconds, error)
+
+        timings = getattr(self._request, "timings", None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        times the body of a with statement as a stage
+
+        Args:
+            stage (str): name of the stage
+        """
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, error)
+
+    def timed(self, stage):
+        """
+        decorator timing every call of a function as a stage
+
+        Args:
+            stage (str): name of the stage
+
+        Returns:
+            callable: decorator
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                error = False
+                try:
+                    return function(*args, **kwargs)
+                except BaseException:
+                    error = True
+                    raise
+                finally:
+                    self.observe(stage, time.perf_counter() - start, error)
+            return wrapper
+        return decorator
+
+    def start_request(self):
+        """starts collecting the stages of the current request for the Server-Timing header"""
+        self._request.timings = dict()
+
+    def end_request(self):
+        """
+        stops collecting the stages of the current request
+
+        Returns:
+            dict: stage -> seconds spent in it during the request
+        """
+        timings = getattr(self._request, "timings", None)
+        self._request.timings = None
+        return timings or dict()
+
+    def snapshot(self):
+        """
+        returns the current state of every stage
+
+        Returns:
+            dict: stage -> count, errors, error_rate, sum, p50, p95, p99
+        """
+        with self._lock:
+            result = dict()
+            for stage, metrics in sorted(self._stages.items()):
+                quantiles = metrics.quantiles()
+                result[stage] = {"count": metrics.count, "errors": metrics.errors,
+                                 "error_rate": metrics.errors / metrics.count if metrics.count else 0.0,
+                                 "sum": metrics.total, "p50": quantiles[0.5], "p95": quantiles[0.95],
+                                 "p99": quantiles[0.99]}
+            return result
+
+    def prometheus_text(self):
+        """
+        returns every stage in the Prometheus text exposition format
+
+        Returns:
+            str: metrics page
+        """
+        name = f"{self.prefix}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent in each pipeline stage.",
+                 f"# TYPE {name} histogram"]
+        quantile_lines = [f"# HELP {name}_recent Quantiles of the most recent timings of each stage.",
+                          f"# TYPE {name}_recent gauge"]
+        error_lines = [f"# HELP {self.prefix}_stage_errors_total Calls of each stage that raised an exception.",
+                       f"# TYPE {self.prefix}_stage_errors_total counter"]
+
+        # every prefork worker keeps its own timings, so the series are told apart by the process
+        pid = os.getpid()
+        with self._lock:
+            for stage, metrics in sorted(self._stages.items()):
+                label = f'stage="{stage}",pid="{pid}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, metrics.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label},le="+Inf"}} {metrics.count}')
+                lines.append(f"{name}_sum{{{label}}} {metrics.total}")
+                lines.append(f"{name}_count{{{label}}} {metrics.count}")
+                for quantile, value in metrics.quantiles().items():
+                    quantile_lines.append(f'{name}_recent{{{label},quantile="{quantile}"}} {value}')
+                error_lines.append(f"{self.prefix}_stage_errors_total{{{label}}} {metrics.errors}")
+
+        return "\n".join(lines + quantile_lines + error_lines) + "\n"
+
+    def reset(self):
+        """forgets every recorded timing"""
+        with self._lock:
+            self._stages.clear()
+
+
+# shared by every instrumented stage in the process
+metrics = MetricsRegistry()
+timed = metrics.timed
+timer = metrics.timer
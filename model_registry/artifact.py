@@ -0,0 +1,370 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# Flat, memory mapped file holding everything needed to predict with a fitted
+# TfidfVectorizer and a linear model (LinearSVC, SGDClassifier, ...):
+#
+#     8 bytes   magic
+#     8 bytes   length of the json header
+#     header    json: vectorizer settings, classes, calibration and where every array starts
+#     arrays    64 byte aligned: sorted vocabulary (offsets into one utf-8 blob), column of
+#               every vocabulary entry, idf, coef and intercept
+#
+# The arrays are read straight from the mapped pages, so every worker process shares
+# one copy and loading only parses the header.
+
+# importing libraries
+import os
+import re
+import sys
+import json
+import mmap
+import pickle
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+from sklearn.utils.extmath import safe_sparse_dot
+
+# importing custom packages
+from model_registry.calibration import ScoreCalibrator
+
+MAGIC = b"IMDBART2"
+ALIGNMENT = 64
+
+
+def export_artifact(vector, model, file_path):
+    """
+    writes a fitted vectorizer and linear model as a memory mappable artifact
+
+    Args:
+        vector (TfidfVectorizer): fitted vector model, default word analyzer only.
+        model (object): fitted linear model with coef_, intercept_ and classes_.
+        file_path (str/path): where to write the artifact.
+
+    Raises:
+        ValueError: the vectorizer or the model uses a setting the artifact cannot reproduce
+
+    Returns:
+        None
+    """
+    check_supported(vector, model)
+    calibrator = getattr(model, "calibrator_", None)
+
+    # sorted by the utf-8 bytes, which is the order numpy compares them in, and stored end to end with a
+    # NUL after each, so a few very long terms (urls, repeated letters) do not pad every other one
+    items = sorted((term.encode("utf-8"), column) for term, column in vector.vocabulary_.items())
+    term_bytes = np.frombuffer(b"".join(term + b"\0" for term, _ in items), dtype=np.uint8)
+    offsets_dtype = np.uint32 if len(term_bytes) < 2 ** 32 else np.uint64
+    term_offsets = np.zeros(len(items) + 1, dtype=offsets_dtype)
+    np.cumsum([len(term) + 1 for term, _ in items], out=term_offsets[1:])
+    columns = np.array([column for _, column in items], dtype=np.int32)
+
+    idf = np.asarray(vector.idf_, dtype=np.float64) if vector.use_idf else np.zeros(0, dtype=np.float64)
+    arrays = {
+        "term_offsets": term_offsets,
+        "term_bytes": term_bytes,
+        "columns": columns,
+        "idf": idf,
+        "coef": np.ascontiguousarray(model.coef_, dtype=np.float64),
+        "intercept": np.ascontiguousarray(np.atleast_1d(model.intercept_), dtype=np.float64),
+    }
+    header = {
+        "vectorizer": {
+            "lowercase": vector.lowercase,
+            "token_pattern": vector.token_pattern,
+            "ngram_range": list(vector.ngram_range),
+            "binary": vector.binary,
+            "sublinear_tf": vector.sublinear_tf,
+            "use_idf": vector.use_idf,
+            "norm": vector.norm,
+        },
+        "classes": [c.item() if isinstance(c, np.generic) else c for c in model.classes_],
+        "n_features": len(vector.vocabulary_),
+        "calibration": calibrator.to_dict() if calibrator is not None else None,
+        "arrays": dict(),
+    }
+
+    # the offsets depend on the header length, which depends on the offsets, so pad it generously
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset = _aligned(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _aligned(16 + len(header_bytes) + 1024)
+    for spec in header["arrays"].values():
+        spec["offset"] += data_start
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    part_path = file_path + ".part"
+    with open(part_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.write(b"\0" * (header["arrays"][name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    # replaced in one step so a reader never maps a half written file
+    os.replace(part_path, file_path)
+
+
+def load_artifact(file_path):
+    """
+    memory maps an artifact written by export_artifact
+
+    Args:
+        file_path (str/path): path of the artifact
+
+    Raises:
+        ValueError: the file is not an artifact
+
+    Returns:
+        ModelArtifact: vectorizer and model in one object
+    """
+    with open(file_path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:8] != MAGIC:
+        raise ValueError(f"{file_path} is not a model artifact")
+    header_length = int(np.frombuffer(buffer, dtype=np.uint64, count=1, offset=8)[0])
+    header = json.loads(bytes(buffer[16:16 + header_length]).decode("utf-8"))
+
+    arrays = dict()
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=spec["offset"]).reshape(spec["shape"])
+    return ModelArtifact(header, arrays, buffer)
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def check_supported(vector, model):
+    """
+    checks that the vectorizer and the model only use settings reproduced outside sklearn
+
+    Args:
+        vector (TfidfVectorizer): fitted vector model
+        model (object): fitted prediction model
+
+    Raises:
+        ValueError: a setting is not supported
+    """
+    unsupported = {
+        "analyzer": (vector.analyzer, "word"),
+        "preprocessor": (vector.preprocessor, None),
+        "tokenizer": (vector.tokenizer, None),
+        "strip_accents": (vector.strip_accents, None),
+        "stop_words": (vector.stop_words, None),
+    }
+    for name, (value, expected) in unsupported.items():
+        if value != expected:
+            raise ValueError(f"vectorizer setting {name}={value!r} is not supported by the artifact")
+    if vector.dtype != np.float64:
+        raise ValueError("only float64 vectorizers are supported by the artifact")
+    if not hasattr(model, "coef_") or not hasattr(model, "intercept_"):
+        raise ValueError(f"{type(model).__name__} is not a linear model")
+
+
+class ModelArtifact:
+    """
+    Vectorizer and linear model read from a memory mapped artifact, it has transform, decision_function
+    and predict like the sklearn models, and gives bit identical results
+
+    Keyword arguments: None
+
+    argument --
+        header: json header of the artifact
+        arrays: numpy arrays backed by the mapped file
+        buffer: the mmap object, kept open for as long as the arrays are used
+
+    Return: None
+    """
+
+    def __init__(self, header, arrays, buffer=None):
+        self.header = header
+        self.settings = header["vectorizer"]
+        self.classes_ = np.array(header["classes"])
+        self.n_features = header["n_features"]
+        self.term_offsets = arrays["term_offsets"]
+        self.term_bytes = arrays["term_bytes"]
+        self.columns = arrays["columns"]
+        self.idf = arrays["idf"]
+        self.coef_ = arrays["coef"]
+        self.intercept_ = arrays["intercept"]
+        calibration = header.get("calibration")
+        self.calibrator_ = ScoreCalibrator.from_dict(calibration) if calibration else None
+        self._buffer = buffer
+        self._token_pattern = re.compile(self.settings["token_pattern"])
+
+    def __repr__(self):
+        return f"ModelArtifact({self.n_features} features, classes={list(self.classes_)})"
+
+    def analyze(self, doc):
+        """
+        splits a document into the terms the vectorizer counts
+
+        Args:
+            doc (str): cleaned review
+
+        Returns:
+            list: word n-grams, in the same order as sklearn's analyzer
+        """
+        if self.settings["lowercase"]:
+            doc = doc.lower()
+        tokens = self._token_pattern.findall(doc)
+        min_n, max_n = self.settings["ngram_range"]
+        if max_n == 1:
+            return tokens
+
+        # same construction as sklearn's _word_ngrams
+        original_tokens = tokens
+        tokens = list(original_tokens) if min_n == 1 else []
+        if min_n == 1:
+            min_n += 1
+        n_original_tokens = len(original_tokens)
+        for n in range(min_n, min(max_n + 1, n_original_tokens + 1)):
+            for i in range(n_original_tokens - n + 1):
+                tokens.append(" ".join(original_tokens[i: i + n]))
+        return tokens
+
+    def lookup(self, terms):
+        """
+        returns the column of every term, -1 for the terms outside the vocabulary
+
+        Args:
+            terms (list): terms to look up
+
+        Returns:
+            numpy.ndarray: columns
+        """
+        if not terms:
+            return np.zeros(0, dtype=np.int64)
+        # one byte more than the longest key, so a vocabulary term longer than its key never compares equal
+        keys = np.array([term.encode("utf-8") for term in terms])
+        keys = keys.astype(f"S{keys.dtype.itemsize + 1}")
+        width = keys.dtype.itemsize
+        n_terms = len(self.columns)
+
+        # branchless binary search of every key at once over the first width bytes of the terms, a term
+        # whose prefix is less than the key is less than the key
+        low = np.zeros(len(keys), dtype=np.int64)
+        size = n_terms
+        while size > 1:
+            half = size // 2
+            less = self._term_prefixes(low + half, width) < keys
+            low += less * half
+            size -= half
+        low += self._term_prefixes(low, width) < keys
+
+        positions = np.minimum(low, n_terms - 1)
+        found = (low < n_terms) & (self._term_prefixes(positions, width) == keys)
+        return np.where(found, self.columns[positions], -1)
+
+    def _term_prefixes(self, rows, width):
+        # the first width bytes of the given vocabulary terms, the NUL ending every term pads the shorter ones
+        last = self.term_offsets[rows + 1].astype(np.int64) - 1
+        index = np.minimum(self.term_offsets[rows].astype(np.int64)[:, None] + np.arange(width), last[:, None])
+        return self.term_bytes[index].view(f"S{width}").ravel()
+
+    def transform(self, raw_documents):
+        """
+        builds the same tf-idf matrix as the exported TfidfVectorizer
+
+        Args:
+            raw_documents (iterable): cleaned reviews
+
+        Returns:
+            scipy.sparse.csr_matrix: tf-idf matrix
+        """
+        analyzed = [self.analyze(doc) for doc in raw_documents]
+        unique_terms = list({term for terms in analyzed for term in terms})
+        term_columns = dict(zip(unique_terms, self.lookup(unique_terms).tolist()))
+
+        j_indices = list()
+        values = list()
+        indptr = [0]
+        for terms in analyzed:
+            counts = dict()
+            for term in terms:
+                column = term_columns[term]
+                if column >= 0:
+                    counts[column] = counts.get(column, 0) + 1
+            j_indices.extend(counts.keys())
+            values.extend(counts.values())
+            indptr.append(len(j_indices))
+
+        x = sp.csr_matrix((np.array(values, dtype=np.float64), np.array(j_indices, dtype=np.int32),
+                           np.array(indptr, dtype=np.int32)),
+                          shape=(len(analyzed), self.n_features), dtype=np.float64)
+        x.sort_indices()
+
+        # same steps, in the same order, as CountVectorizer and TfidfTransformer
+        if self.settings["binary"]:
+            x.data.fill(1)
+        if self.settings["sublinear_tf"]:
+            np.log(x.data, x.data)
+            x.data += 1
+        if self.settings["use_idf"]:
+            x.data *= self.idf[x.indices]
+        if self.settings["norm"] is not None:
+            x = normalize(x, norm=self.settings["norm"], copy=False)
+        return x
+
+    def decision_function(self, x):
+        """
+        returns the signed distance of every row to the separating hyperplane
+
+        Args:
+            x (sparse matrix): output of transform
+
+        Returns:
+            numpy.ndarray: scores, one column per class for more than two classes
+        """
+        scores = safe_sparse_dot(x, self.coef_.T, dense_output=True) + self.intercept_
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict(self, x):
+        """
+        predicts the class of every row
+
+        Args:
+            x (sparse matrix): output of transform
+
+        Returns:
+            numpy.ndarray: predicted labels
+        """
+        scores = self.decision_function(x)
+        if scores.ndim == 1:
+            indices = (scores > 0).astype(int)
+        else:
+            indices = scores.argmax(axis=1)
+        return self.classes_[indices]
+
+
+if __name__ == "__main__":
+    # python -m model_registry.artifact Training_Data/vectorize.pickle Training_Data/svc_model.sav Training_Data/model.artifact
+    vector_path, model_path, artifact_path = sys.argv[1:4]
+    with open(vector_path, 'rb') as f:
+        vector = pickle.load(f)
+    export_artifact(vector, joblib.load(model_path), artifact_path)
+    print(load_artifact(artifact_path))
@@ -0,0 +1,185 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import numpy as np
+
+CALIBRATION_METHODS = ("sigmoid", "isotonic")
+
+
+def decision_scores(model, x):
+    """
+    returns one score per row that grows with the probability of the second class,
+    the decision function of linear models and the probability of the others (for example MultinomialNB)
+
+    Args:
+        model (object): fitted binary classifier.
+        x (sparse_matrix): output of the vector model.
+
+    Returns:
+        numpy.ndarray: score of every row
+    """
+    if hasattr(model, "decision_function"):
+        return np.ravel(model.decision_function(x)).astype(np.float64)
+    return np.asarray(model.predict_proba(x)[:, 1], dtype=np.float64)
+
+
+class ScoreCalibrator:
+    """
+    Class to map the scores of a binary classifier to calibrated probabilities, fitted on data the
+    classifier was not trained on and saved with the model as its calibrator_ attribute
+
+    Keyword arguments:
+        method="sigmoid"
+
+    argument --
+        method: "sigmoid" (Platt scaling, two parameters) or "isotonic" (monotone step function,
+            needs more calibration data).
+
+    Return: None
+    """
+
+    def __init__(self, method="sigmoid"):
+        if method not in CALIBRATION_METHODS:
+            raise ValueError(f"method must be one of {CALIBRATION_METHODS}, got {method!r}")
+        self.method = method
+        self.classes = None
+        self.a = None
+        self.b = None
+        self.x_thresholds = None
+        self.y_thresholds = None
+
+    def __repr__(self):
+        return f"ScoreCalibrator({self.method}, classes={self.classes})"
+
+    def fit(self, scores, y, classes):
+        """
+        fits the mapping from score to the probability of classes[1]
+
+        Args:
+            scores (array): scores of the calibration rows, see decision_scores.
+            y (array): true labels of the calibration rows.
+            classes (list): the two labels of the classifier, in the order of its classes_.
+
+        Raises:
+            ValueError: the classifier is not binary
+
+        Returns:
+            ScoreCalibrator: self
+        """
+        if len(classes) != 2:
+            raise ValueError(f"calibration needs a binary classifier, got {len(classes)} classes")
+        self.classes = [c.item() if isinstance(c, np.generic) else c for c in classes]
+        scores = np.asarray(scores, dtype=np.float64)
+        positive = (np.asarray(y) == classes[1]).astype(np.float64)
+
+        if self.method == "sigmoid":
+            from sklearn.linear_model import LogisticRegression
+            platt = LogisticRegression(C=1e6).fit(scores.reshape(-1, 1), positive)
+            self.a = float(platt.coef_[0, 0])
+            self.b = float(platt.intercept_[0])
+        else:
+            from sklearn.isotonic import IsotonicRegression
+            isotonic = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip").fit(scores, positive)
+            self.x_thresholds = np.asarray(isotonic.X_thresholds_, dtype=np.float64)
+            self.y_thresholds = np.asarray(isotonic.y_thresholds_, dtype=np.float64)
+        return self
+
+    def predict_proba(self, scores):
+        """
+        returns the calibrated probability of classes[1] for every score
+
+        Args:
+            scores (float/array): scores, see decision_scores.
+
+        Returns:
+            numpy.ndarray: probabilities, same shape as scores
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        if self.method == "sigmoid":
+            return 1.0 / (1.0 + np.exp(-(self.a * scores + self.b)))
+        return np.interp(scores, self.x_thresholds, self.y_thresholds)
+
+    def label_probability(self, labels, scores):
+        """
+        returns the calibrated probability of the given label of every row
+
+        Args:
+            labels (array): label predicted for every row.
+            scores (array): score of every row.
+
+        Returns:
+            numpy.ndarray: probability of each label
+        """
+        positive = self.predict_proba(scores)
+        return np.where(np.asarray(labels).astype(str) == str(self.classes[1]), positive, 1.0 - positive)
+
+    def to_dict(self):
+        """
+        returns the calibrator as plain json types, used by the model artifact
+
+        Returns:
+            dict: method, classes and parameters
+        """
+        return {"method": self.method, "classes": self.classes, "a": self.a, "b": self.b,
+                "x_thresholds": None if self.x_thresholds is None else self.x_thresholds.tolist(),
+                "y_thresholds": None if self.y_thresholds is None else self.y_thresholds.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        rebuilds a calibrator written by to_dict
+
+        Args:
+            data (dict): output of to_dict.
+
+        Returns:
+            ScoreCalibrator: the calibrator
+        """
+        calibrator = cls(data["method"])
+        calibrator.classes = data["classes"]
+        calibrator.a = data["a"]
+        calibrator.b = data["b"]
+        if data["x_thresholds"] is not None:
+            calibrator.x_thresholds = np.asarray(data["x_thresholds"], dtype=np.float64)
+            calibrator.y_thresholds = np.asarray(data["y_thresholds"], dtype=np.float64)
+        return calibrator
+
+
+def calibration_error(probabilities, positive, bins=10):
+    """
+    returns the expected calibration error: the gap between the predicted probability and the observed
+    frequency, averaged over equal width probability bins weighted by their size
+
+    Args:
+        probabilities (array): predicted probability of the positive class.
+        positive (array): 1 for positive rows, 0 for the others.
+        bins (int, optional): number of bins. Defaults to 10.
+
+    Returns:
+        float: expected calibration error
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    positive = np.asarray(positive, dtype=np.float64)
+    ids = np.minimum((probabilities * bins).astype(int), bins - 1)
+    counts = np.bincount(ids, minlength=bins)
+    gaps = np.abs(np.bincount(ids, probabilities, bins) - np.bincount(ids, positive, bins))
+    return float(gaps.sum() / max(counts.sum(), 1))
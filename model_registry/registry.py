@@ -0,0 +1,271 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import os
+import pickle
+import hashlib
+import threading
+import joblib
+import numpy as np
+
+# importing custom packages
+from Logging.logger import Logging
+
+
+def _load_pickle(file_path):
+    with open(file_path, 'rb') as f:
+        return pickle.load(f)
+
+
+def vector_fingerprint(vector):
+    """
+    returns a hash of what a fitted vector model outputs, its terms in column order and its idf,
+    training stores it on the model as vector_fingerprint_ so a model is only served with its own vector model
+
+    Args:
+        vector (TfidfVectorizer): fitted vector model
+
+    Returns:
+        str: hex digest, None for a vector model without vocabulary_
+    """
+    vocabulary = getattr(vector, "vocabulary_", None)
+    if vocabulary is None:
+        return None
+    digest = hashlib.sha1("\n".join(sorted(vocabulary, key=vocabulary.get)).encode("utf-8"))
+    idf = getattr(vector, "idf_", None)
+    if idf is not None:
+        digest.update(np.ascontiguousarray(idf, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Process wide cache of the trained models, every (vector model, prediction model) pair
+    is loaded once per worker and reloaded only when one of the files changes on disk
+
+    Keyword arguments:
+        log_folder_name="Prediction_Logs",
+        log_file_name="4-model_registry.txt"
+
+    argument --
+        log_folder_name: Specifies the folder for Prediction Logs.
+        log_file_name: Specifies the name of the log file.
+
+    Return: None
+    """
+
+    def __init__(self, log_folder_name="Prediction_Logs", log_file_name="4-model_registry.txt"):
+        self._lock = threading.RLock()
+        self._files = dict()  # path -> (signature, loaded object)
+        self._pairs = dict()  # (vector path, model path) -> (signature, (vector, model))
+        self._derived = dict()  # (vector path, model path, name) -> (model it was built from, object)
+        self.log = Logging(os.path.join(log_folder_name, log_file_name))
+
+    def __repr__(self):
+        return f"ModelRegistry({len(self._pairs)} pairs loaded)"
+
+    @staticmethod
+    def file_signature(file_path):
+        """
+        returns the signature used to detect a changed model file
+
+        Args:
+            file_path (str/path): path of the model file
+
+        Returns:
+            tuple: (modification time in ns, size in bytes)
+        """
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def signature(self, vector_path, model_path):
+        """
+        returns the combined signature of a (vector model, prediction model) pair
+
+        Args:
+            vector_path (str/path): path of the vector model
+            model_path (str/path): path of the prediction model
+
+        Returns:
+            tuple: signatures of both the files
+        """
+        return (self.file_signature(vector_path), self.file_signature(model_path))
+
+    def load_file(self, file_path, loader=_load_pickle):
+        """
+        loads a single file through the cache
+
+        Args:
+            file_path (str/path): path of the file to be loaded
+            loader (callable, optional): function used to deserialize the file. Defaults to pickle.load.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            object: the deserialized object
+        """
+        try:
+            signature = self.file_signature(file_path)
+            entry = self._files.get(file_path)
+            if entry and entry[0] == signature:
+                return entry[1]
+
+            with self._lock:
+                # another thread might have loaded it while we were waiting
+                entry = self._files.get(file_path)
+                if entry and entry[0] == signature:
+                    return entry[1]
+
+                obj = loader(file_path)
+                self._files[file_path] = (signature, obj)
+                self.log.info(f"Loaded {file_path} into the registry!!")
+                return obj
+
+        except Exception as e:
+            self.log.error(f"function load_file: {e}")
+            raise Exception(e)
+
+    def get_models(self, vector_path, model_path):
+        """
+        returns the (vector model, prediction model) pair, loading it only if one of the files changed
+
+        Args:
+            vector_path (str/path): path of the pickled vector model
+            model_path (str/path): path of the joblib prediction model
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            (object, object): vector model, prediction model
+        """
+        key = (vector_path, model_path)
+        try:
+            signature = self.signature(vector_path, model_path)
+            entry = self._pairs.get(key)
+            if entry and entry[0] == signature:
+                return entry[1]
+
+            with self._lock:
+                entry = self._pairs.get(key)
+                if entry and entry[0] == signature:
+                    return entry[1]
+
+                vector = self.load_file(vector_path, _load_pickle)
+                model = self.load_file(model_path, joblib.load)
+
+                if not self._compatible(vector, model):
+                    # the files are being swapped, keep serving the old pair until both are replaced
+                    if entry:
+                        self.log.warning(f"Models {key} do not match, serving the previous pair!")
+                        return entry[1]
+                    raise ValueError(f"vector model {vector_path} does not match model {model_path}")
+
+                # single assignment so readers see either the old pair or the new one
+                self._pairs[key] = (signature, (vector, model))
+                self.log.info(f"Model pair {key} is ready!!")
+                return vector, model
+
+        except Exception as e:
+            self.log.error(f"function get_models: {e}")
+            raise Exception(e)
+
+    def get_derived(self, vector_path, model_path, name, builder):
+        """
+        returns an object built from the current (vector model, prediction model) pair, for example a faster scorer,
+        it is rebuilt only when the pair is reloaded
+
+        Args:
+            vector_path (str/path): path of the pickled vector model
+            model_path (str/path): path of the joblib prediction model
+            name (str): name of the derived object
+            builder (callable): builder(vector, model) -> object, may return None when it does not apply
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            object: the derived object
+        """
+        try:
+            vector, model = self.get_models(vector_path, model_path)
+            key = (vector_path, model_path, name)
+            entry = self._derived.get(key)
+            if entry and entry[0] is model:
+                return entry[1]
+
+            with self._lock:
+                entry = self._derived.get(key)
+                if entry and entry[0] is model:
+                    return entry[1]
+                obj = builder(vector, model)
+                self._derived[key] = (model, obj)
+                self.log.info(f"Built {name} for {(vector_path, model_path)}!!")
+                return obj
+
+        except Exception as e:
+            self.log.error(f"function get_derived: {e}")
+            raise Exception(e)
+
+    @staticmethod
+    def _compatible(vector, model):
+        # retrains with the same number of features only differ in the fingerprint
+        fingerprint = getattr(model, "vector_fingerprint_", None)
+        if fingerprint is not None:
+            return fingerprint == vector_fingerprint(vector)
+        vocabulary = getattr(vector, "vocabulary_", None)
+        n_features = getattr(model, "n_features_in_", None)
+        if vocabulary is None or n_features is None:
+            return True
+        return len(vocabulary) == n_features
+
+    def install_files(self, replacements):
+        """
+        moves freshly written model files over the served ones while no model is being loaded in this process,
+        other processes fall back to the previous pair until every file is replaced
+
+        Args:
+            replacements (list): (new file path, served file path) pairs, on the same filesystem
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+        """
+        try:
+            with self._lock:
+                for source, destination in replacements:
+                    os.replace(source, destination)
+            self.log.info(f"Installed {[destination for _, destination in replacements]}!!")
+        except Exception as e:
+            self.log.error(f"function install_files: {e}")
+            raise Exception(e)
+
+    def clear(self):
+        """removes every loaded model from the registry"""
+        with self._lock:
+            self._files.clear()
+            self._pairs.clear()
+            self._derived.clear()
+
+
+# shared by every PredictAPI instance in the worker
+model_registry = ModelRegistry()
@@ -0,0 +1,154 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import re
+import numpy as np
+
+# importing custom packages
+from model_registry.artifact import check_supported
+
+
+class FastScorer:
+    """
+    Scores one review straight from token ids with NumPy, skipping the validation and sparse matrix
+    construction sklearn does for every transform and predict call
+
+    Keyword arguments: None
+
+    argument --
+        vocabulary: term -> feature id of the fitted TfidfVectorizer
+        idf: idf of every feature, None if the vectorizer does not use idf
+        coef: weight of every feature in the linear model
+        intercept: bias of the linear model
+        classes: the two labels, negative score first
+        settings: lowercase, token_pattern, ngram_range, binary, sublinear_tf and norm of the vectorizer
+        calibrator: ScoreCalibrator of the model, None if it has no calibrated probabilities
+
+    Return: None
+    """
+
+    def __init__(self, vocabulary, idf, coef, intercept, classes, settings, calibrator=None):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.coef = coef
+        self.intercept = float(intercept)
+        self.classes = list(classes)
+        self.calibrator = calibrator
+        self.lowercase = settings["lowercase"]
+        self.ngram_range = tuple(settings["ngram_range"])
+        self.binary = settings["binary"]
+        self.sublinear_tf = settings["sublinear_tf"]
+        self.norm = settings["norm"]
+        self._token_pattern = re.compile(settings["token_pattern"])
+
+    def __repr__(self):
+        return f"FastScorer({len(self.vocabulary)} features, classes={self.classes})"
+
+    @classmethod
+    def from_models(cls, vector, model):
+        """
+        builds the scorer from the TfidfVectorizer and the linear model saved by TrainingAPI
+
+        Args:
+            vector (TfidfVectorizer): fitted vector model
+            model (object): fitted binary linear model, for example LinearSVC
+
+        Raises:
+            ValueError: the models use a setting the scorer cannot reproduce
+
+        Returns:
+            FastScorer: scorer
+        """
+        check_supported(vector, model)
+        if len(model.classes_) != 2:
+            raise ValueError("FastScorer only supports binary models")
+
+        settings = {"lowercase": vector.lowercase, "token_pattern": vector.token_pattern,
+                    "ngram_range": vector.ngram_range, "binary": vector.binary,
+                    "sublinear_tf": vector.sublinear_tf, "norm": vector.norm}
+        idf = np.asarray(vector.idf_, dtype=np.float64) if vector.use_idf else None
+        return cls(dict(vector.vocabulary_), idf, np.asarray(model.coef_, dtype=np.float64).ravel(),
+                   np.ravel(model.intercept_)[0], [str(c) for c in model.classes_], settings,
+                   calibrator=getattr(model, "calibrator_", None))
+
+    def _terms(self, doc):
+        if self.lowercase:
+            doc = doc.lower()
+        tokens = self._token_pattern.findall(doc)
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        terms = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            terms.extend(" ".join(tokens[i: i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def decision_value(self, doc):
+        """
+        returns the linear model score of a cleaned review
+
+        Args:
+            doc (str): cleaned review
+
+        Returns:
+            float: score, positive for the second class
+        """
+        counts = dict()
+        vocabulary = self.vocabulary
+        for term in self._terms(doc):
+            feature = vocabulary.get(term)
+            if feature is not None:
+                counts[feature] = counts.get(feature, 0) + 1
+        if not counts:
+            return self.intercept
+
+        ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.binary:
+            weights.fill(1)
+        if self.sublinear_tf:
+            weights = np.log(weights) + 1
+        if self.idf is not None:
+            weights *= self.idf[ids]
+
+        if self.norm == "l2":
+            norm = np.sqrt(weights @ weights)
+        elif self.norm == "l1":
+            norm = np.abs(weights).sum()
+        else:
+            norm = 1.0
+        if norm == 0:
+            return self.intercept
+        return float(weights @ self.coef[ids]) / norm + self.intercept
+
+    def predict_one(self, doc):
+        """
+        predicts a cleaned review
+
+        Args:
+            doc (str): cleaned review
+
+        Returns:
+            (str, float): label, score
+        """
+        score = self.decision_value(doc)
+        return self.classes[1 if score > 0 else 0], score
@@ -21,17 +21,24 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 # importing libraries
 import os
-import pickle
-import joblib
 import numpy as np
 import pandas as pd
 from flask import jsonify
 
 # importing custom packages
 from Logging.logger import Logging
+from instrumentation.metrics import timed, timer
+from model_registry.registry import model_registry
+from model_registry.artifact import load_artifact
+from model_registry.calibration import decision_scores
+from predicting_model.fast_scorer import FastScorer
 from data_import.data_input import DataInput
 from data_cleaning.data_cleaning import Cleaner
 
+# label returned instead of the prediction when its calibrated probability is below the abstain threshold
+UNCERTAIN = "uncertain"
+RESULT_FIELDS = ("cleaned", "label", "score", "probability")
+
 
 class PredictAPI:
     """
@@ -48,22 +55,136 @@ class PredictAPI:
         training_folder_path: Folder path where models are stored.
         log_folder_name: Specifies the folder for Training Logs.
         log_file_name: Specifies the name of the log file.
+        registry: ModelRegistry used to load the models, shared by the whole process by default.
+        prediction_cache: PredictionCache used by predict_review, None for no caching.
+        artifact_name: memory mapped model artifact inside the training folder used instead of the
+            pickled models, None to use the pickles.
+        fast_scorer: Whether predict_review scores single reviews with the NumPy FastScorer instead of sklearn.
+        abstain_threshold: predictions whose calibrated probability is below it are labelled "uncertain",
+            None to always return the predicted label. Needs a model trained with calibration.
+        stem_table_name: surface word -> stem table saved by TrainingAPI inside the training folder, the cleaner
+            looks the words up in it before stemming. None to always run the stemmer.
     
     Return: None
     """
     
     def __init__(self, prediction_folder_path="Prediction_Data", training_folder_path="Training_Data",
-                 log_folder_name="Prediction_Logs", log_file_name="3-prediction.txt"):
+                 log_folder_name="Prediction_Logs", log_file_name="3-prediction.txt", registry=None,
+                 prediction_cache=None, artifact_name=None, fast_scorer=True, abstain_threshold=None,
+                 stem_table_name="stem_table.pickle"):
         self.prediction_folder_path = prediction_folder_path
         self.training_folder_path = training_folder_path
+        self.registry = registry if registry is not None else model_registry
+        self.prediction_cache = prediction_cache
+        self.artifact_name = artifact_name
+        self.fast_scorer = fast_scorer
+        self.abstain_threshold = abstain_threshold
+        self.stem_table_name = stem_table_name
         self.data_input = DataInput(log_folder_name, "1-file_input.txt")
         self.cleaner = Cleaner(log_folder_name, "2-data_cleaning.txt")
 
-        if prediction_folder_path not in os.listdir():
-            os.mkdir(prediction_folder_path)
+        os.makedirs(prediction_folder_path, exist_ok=True)
 
         self.log = Logging(os.path.join(log_folder_name, log_file_name))
 
+    @timed("predict.load_models")
+    def load_models(self, model_name="svc_model.sav", vector_model="vectorize.pickle"):
+        """
+        returns the vector model and the prediction model through the model registry,
+        the files are only read again when they change on disk
+
+        Args:
+            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "svc_model.sav".
+            vector_model (str, optional): name of the vector model inside Training_Data Folder. Defaults to "vectorize.pickle".
+
+        Raises:
+            Exception: any Exception, check logs for specifics, other models than the defaults are
+                requested while an artifact is served
+
+        Returns:
+            (object, object): vector model, prediction model
+        """
+        try:
+            if self.artifact_name:
+                if (model_name, vector_model) != ("svc_model.sav", "vectorize.pickle"):
+                    # the artifact holds a single model, serving it for another name would be wrong silently
+                    raise ValueError(f"{model_name} and {vector_model} requested while {self.artifact_name} "
+                                     f"is served, use a PredictAPI without artifact_name for them")
+                # the artifact transforms and predicts, it stands in for both the models
+                artifact = self.registry.load_file(os.path.join(self.training_folder_path, self.artifact_name),
+                                                   load_artifact)
+                return artifact, artifact
+
+            vector_path = os.path.join(self.training_folder_path, vector_model)
+            model_path = os.path.join(self.training_folder_path, model_name)
+            return self.registry.get_models(vector_path, model_path)
+        except Exception as e:
+            self.log.error(f"function load_models: {e}")
+            raise Exception(e)
+
+    @timed("predict.load_scorer")
+    def load_scorer(self, model_name="svc_model.sav", vector_model="vectorize.pickle"):
+        """
+        returns the FastScorer built from the pickled models, None when it cannot reproduce them
+
+        Args:
+            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "svc_model.sav".
+            vector_model (str, optional): name of the vector model inside Training_Data Folder. Defaults to "vectorize.pickle".
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            FastScorer: scorer or None
+        """
+        try:
+            return self.registry.get_derived(os.path.join(self.training_folder_path, vector_model),
+                                             os.path.join(self.training_folder_path, model_name),
+                                             "fast_scorer", _build_scorer)
+        except Exception as e:
+            self.log.error(f"function load_scorer: {e}")
+            raise Exception(e)
+
+    def load_stem_table(self):
+        """
+        returns the stem table through the model registry and hands it to the cleaner when it changed on disk
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            dict: surface word -> stem, None if there is no table
+        """
+        try:
+            stem_table = None
+            if self.stem_table_name:
+                table_path = os.path.join(self.training_folder_path, self.stem_table_name)
+                if os.path.exists(table_path):
+                    stem_table = self.registry.load_file(table_path)
+            if stem_table is not self.cleaner.stem_table:
+                self.cleaner.set_stem_table(stem_table)
+            return stem_table
+        except Exception as e:
+            self.log.error(f"function load_stem_table: {e}")
+            raise Exception(e)
+
+    def models_signature(self, model_name="svc_model.sav", vector_model="vectorize.pickle"):
+        """
+        returns the signature of the model files currently on disk, it changes whenever they are replaced
+
+        Args:
+            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "svc_model.sav".
+            vector_model (str, optional): name of the vector model inside Training_Data Folder. Defaults to "vectorize.pickle".
+
+        Returns:
+            tuple: signature of the files
+        """
+        if self.artifact_name:
+            return self.registry.file_signature(os.path.join(self.training_folder_path, self.artifact_name))
+        return self.registry.signature(os.path.join(self.training_folder_path, vector_model),
+                                       os.path.join(self.training_folder_path, model_name))
+
+    @timed("predict.clean_sentence")
     def clean_sentence(self, sentence):
         """
         cleans the sentence for prediction
@@ -78,6 +199,7 @@ class PredictAPI:
             string: cleaned sentence
         """
         try:
+            self.load_stem_table()
             sentence = self.cleaner.review_to_words(sentence)
             self.log.info("Sentence Cleaned!!")
             return sentence
@@ -85,6 +207,30 @@ class PredictAPI:
             self.log.error(f"function clean_sentence: {e}")
             raise Exception(e)
 
+    @timed("predict.clean_sentences")
+    def clean_sentences(self, sentences):
+        """
+        cleans a list of sentences for batch prediction
+
+        Args:
+            sentences (list): sentences to be cleaned
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            list: cleaned sentences in the same order
+        """
+        try:
+            self.load_stem_table()
+            review_to_words = self.cleaner.review_to_words
+            cleaned = [review_to_words(sentence) for sentence in sentences]
+            self.log.info(f"{len(cleaned)} Sentences Cleaned!!")
+            return cleaned
+        except Exception as e:
+            self.log.error(f"function clean_sentences: {e}")
+            raise Exception(e)
+
     def clean_csv_data(self, csv_path):
         """cleans the csv data for prediction
 
@@ -100,6 +246,7 @@ class PredictAPI:
         
         try:
             df = self.data_input.ret_dataframe(csv_path)
+            self.load_stem_table()
             cleaned_df = self.cleaner.ret_cleaned_dataframe(df)
             self.log.info("CSV Cleaned!!")
             return cleaned_df
@@ -107,13 +254,14 @@ class PredictAPI:
             self.log.error(f"function clean_csv_data: {e}")
             raise Exception(e)
 
-    def predict_model_csv(self, dataframe, model_name="model.sav", vector_model="vectorize.pickle"):
+    @timed("predict.predict_model_csv")
+    def predict_model_csv(self, dataframe, model_name="svc_model.sav", vector_model="vectorize.pickle"):
         """
         predicts the output and stores in csv file
 
         Args:
             dataframe (pandas.DataFrame): DataFrame used for prediction
-            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "model.sav".
+            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "svc_model.sav".
             vector_model (str, optional): name of the vector model inside Training_Data Folder. Defaults to "vectorize.pickle".
 
         Raises:
@@ -124,23 +272,18 @@ class PredictAPI:
         """
         
         try:
-            vector_path = os.path.join(self.training_folder_path, vector_model)
-            model_path = os.path.join(self.training_folder_path, model_name)
-            with open(vector_path, 'rb') as f:
-                vector = pickle.load(f)
-                self.log.info("Vector model loaded Successfully!!")
-
-            nb_model = joblib.load(model_path)
-            self.log.info("Naive Bayes model loaded Successfully!!")
+            vector, nb_model = self.load_models(model_name, vector_model)
             df_cols = dataframe.columns
             x = dataframe[df_cols[0]]
             x_vector = vector.transform(x)
             self.log.info("Data Vector Transformation Successful!!")
 
             y_predict = nb_model.predict(x_vector)
+            labels, probabilities = self._label_probabilities(nb_model, y_predict, x_vector)
             self.log.info("Prediction Successful!!")
 
-            dataframe["sentiment"] = y_predict
+            dataframe["sentiment"] = labels
+            dataframe["probability"] = probabilities
             csv_save_path = os.path.join(self.prediction_folder_path, "Prediction.csv")
             dataframe.to_csv(csv_save_path, index_label=False)
             self.log.info(f"Successfully Saved the Prediction file at location: {csv_save_path}")
@@ -149,47 +292,220 @@ class PredictAPI:
             self.log.error(f"function predict_model_csv: {e}")
             raise Exception(e)
 
+    @timed("predict.predict_csv_in_chunks")
+    def predict_csv_in_chunks(self, csv_path, chunksize=10000, model_name="svc_model.sav", vector_model="vectorize.pickle",
+                              file_name="Prediction.csv", progress_callback=None):
+        """
+        streams a csv file through cleaning, vectorizing and prediction one chunk at a time,
+        every chunk is appended to the prediction file before the next one is read so memory stays bounded
+
+        Args:
+            csv_path (string/path): path to the csv file.
+            chunksize (int, optional): number of rows read, cleaned and predicted at a time. Defaults to 10000.
+            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "svc_model.sav".
+            vector_model (str, optional): name of the vector model inside Training_Data Folder. Defaults to "vectorize.pickle".
+            file_name (str, optional): name of the prediction file inside Prediction_Data Folder. Defaults to "Prediction.csv".
+            progress_callback (callable, optional): called as progress_callback(chunk_number, rows_done) after every chunk.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            int: number of rows predicted
+        """
+        try:
+            vector, model = self.load_models(model_name, vector_model)
+            self.load_stem_table()
+            csv_save_path = os.path.join(self.prediction_folder_path, file_name)
+            # written under a temporary name so a half written file is never mistaken for a result
+            part_path = csv_save_path + ".part"
+
+            rows_done = 0
+            for chunk_number, df in enumerate(self.data_input.ret_dataframe_chunks(csv_path, chunksize), start=1):
+                if df.empty:
+                    # a chunk of only empty rows, the vector model cannot predict zero rows
+                    continue
+                cleaned_df = self.cleaner.ret_cleaned_dataframe(df)
+                x_vector = vector.transform(cleaned_df[cleaned_df.columns[0]])
+                cleaned_df["sentiment"], cleaned_df["probability"] = self._label_probabilities(
+                    model, model.predict(x_vector), x_vector)
+                # the header goes with the first rows written, which may not be in the first chunk
+                cleaned_df.to_csv(part_path, mode="a" if rows_done else "w",
+                                  header=not rows_done, index_label=False)
+
+                rows_done += len(cleaned_df)
+                self.log.info(f"Chunk {chunk_number} Predicted, {rows_done} rows done!!")
+                if progress_callback:
+                    progress_callback(chunk_number, rows_done)
+
+            if not rows_done:
+                raise ValueError(f"{csv_path} has no rows to predict")
+
+            os.replace(part_path, csv_save_path)
+            self.log.info(f"Successfully Saved the Prediction file at location: {csv_save_path}")
+            return rows_done
+
+        except Exception as e:
+            self.log.error(f"function predict_csv_in_chunks: {e}")
+            raise Exception(e)
+
+    @timed("predict.predict_model_sentence")
     def predict_model_sentence(self, sentence, model_name="svc_model.sav", vector_model="vectorize.pickle"):
         """
         predicts the output and returns it
 
         Args:
             sentence (string): sentence to be predicted.
-            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "model.sav".
+            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "svc_model.sav".
             vector_model (str, optional): name of the vector model inside Training_Data Folder. Defaults to "vectorize.pickle".
 
         Raises:
             Exception: any Exception, check logs for specifics
             
         Returns:
-            str: predicted data
+            str: predicted data, "uncertain" when its probability is below the abstain threshold
         """
         try:
-            df = pd.DataFrame([sentence], columns=['review'])
+            vector, nb_model = self.load_models(model_name, vector_model)
 
-            vector_path = os.path.join(self.training_folder_path, vector_model)
-            model_path = os.path.join(self.training_folder_path, model_name)
-            with open(vector_path, 'rb') as f:
-                vector = pickle.load(f)
-                self.log.info("Vector model loaded Successfully!!")
-
-            nb_model = joblib.load(model_path)
-            self.log.info("Naive Bayes model loaded Successfully!!")
-
-            x_vector = vector.transform(df['review'])
-            # print(x_vector)
+            x_vector = vector.transform([sentence])
             y_predict = nb_model.predict(x_vector)
-            print(y_predict)
-            # predicted_probability = nb_model.predict_proba(x_vector)
-            # if list(predicted_probability.flatten())[0] == list(predicted_probability.flatten())[1]:
-            #     print("UNKNOWN")
-            # elif list(predicted_probability.flatten())[np.argmax(predicted_probability)] > 0.6:
-            # else:
-            #     print("UNKNOWN")
+            labels, _ = self._label_probabilities(nb_model, y_predict, x_vector)
 
             self.log.info("Prediction Successful!!")
-            return y_predict[0]
+            return labels[0]
 
         except Exception as e:
             self.log.error(f"function predict_model_sentence: {e}")
             raise Exception(e)
+
+    @timed("predict.predict_many")
+    def predict_many(self, reviews, model_name="svc_model.sav", vector_model="vectorize.pickle"):
+        """
+        cleans and predicts a batch of raw reviews with a single transform and predict call
+
+        Args:
+            reviews (list): raw reviews to be predicted.
+            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "svc_model.sav".
+            vector_model (str, optional): name of the vector model inside Training_Data Folder. Defaults to "vectorize.pickle".
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            list: one dict per review with the predicted "label", the decision "score" and the calibrated
+                "probability" of the label (None if the model is not calibrated)
+        """
+        try:
+            cleaned = self.clean_sentences(reviews)
+            vector, model = self.load_models(model_name, vector_model)
+
+            with timer("predict.transform"):
+                x_vector = vector.transform(cleaned)
+            with timer("predict.model"):
+                y_predict = model.predict(x_vector)
+                scores = decision_scores(model, x_vector)
+                labels, probabilities = self._label_probabilities(model, y_predict, scores=scores)
+            self.log.info(f"Batch Prediction of {len(cleaned)} reviews Successful!!")
+
+            return [{"label": label, "score": score, "probability": probability}
+                    for label, score, probability in zip(labels, scores.tolist(), probabilities)]
+
+        except Exception as e:
+            self.log.error(f"function predict_many: {e}")
+            raise Exception(e)
+
+    @timed("predict.predict_review")
+    def predict_review(self, review, model_name="svc_model.sav", vector_model="vectorize.pickle"):
+        """
+        cleans and predicts a raw review through the prediction cache,
+        a repeated review or one that cleans to an already seen text skips the model
+
+        Args:
+            review (string): raw review to be predicted.
+            model_name (str, optional): name of the prediction model inside Training_Data Folder. Defaults to "svc_model.sav".
+            vector_model (str, optional): name of the vector model inside Training_Data Folder. Defaults to "vectorize.pickle".
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            dict: "cleaned" review, predicted "label", decision "score" and calibrated "probability"
+        """
+        try:
+            cache = self.prediction_cache
+            if cache is None:
+                return self._abstain(self._predict_cleaned(self.clean_sentence(review), model_name, vector_model))
+
+            # the models changing on disk empties the cache
+            cache.validate(self.models_signature(model_name, vector_model))
+
+            # one hit or miss per review, the raw review is an alias of its cleaned text
+            raw_key = ("raw", model_name, review)
+            cached = cache.get(raw_key, count_miss=False)
+            if cached is not None:
+                return self._abstain(dict(zip(RESULT_FIELDS, cached)))
+
+            cleaned = self.clean_sentence(review)
+            clean_key = ("clean", model_name, cleaned)
+            cached = cache.get(clean_key)
+            if cached is None:
+                result = self._predict_cleaned(cleaned, model_name, vector_model)
+                cached = tuple(result[field] for field in RESULT_FIELDS)
+                cache.put(clean_key, cached)
+            cache.alias(raw_key, clean_key)
+            return self._abstain(dict(zip(RESULT_FIELDS, cached)))
+
+        except Exception as e:
+            self.log.error(f"function predict_review: {e}")
+            raise Exception(e)
+
+    def _label_probabilities(self, model, labels, x_vector=None, scores=None):
+        # probability of every predicted label from the scores of the same pass, labels below the
+        # abstain threshold become UNCERTAIN
+        calibrator = getattr(model, "calibrator_", None)
+        if calibrator is None:
+            return [str(label) for label in labels], [None] * len(labels)
+        if scores is None:
+            scores = decision_scores(model, x_vector)
+        probabilities = calibrator.label_probability(labels, scores)
+        labels = np.asarray(labels).astype(str)
+        if self.abstain_threshold is not None:
+            labels = np.where(probabilities < self.abstain_threshold, UNCERTAIN, labels)
+        return labels.tolist(), probabilities.tolist()
+
+    def _abstain(self, result):
+        probability = result["probability"]
+        if self.abstain_threshold is not None and probability is not None and probability < self.abstain_threshold:
+            result["label"] = UNCERTAIN
+        return result
+
+    def _predict_cleaned(self, cleaned, model_name, vector_model):
+        scorer = self.load_scorer(model_name, vector_model) if self.fast_scorer and not self.artifact_name else None
+        if scorer is not None:
+            with timer("predict.fast_scorer"):
+                label, score = scorer.predict_one(cleaned)
+                probability = None
+                if scorer.calibrator is not None:
+                    probability = float(scorer.calibrator.label_probability([label], [score])[0])
+            self.log.info("Prediction Successful!!")
+            return {"cleaned": cleaned, "label": label, "score": score, "probability": probability}
+
+        vector, model = self.load_models(model_name, vector_model)
+        with timer("predict.transform"):
+            x_vector = vector.transform([cleaned])
+        with timer("predict.model"):
+            label = str(model.predict(x_vector)[0])
+            score = float(decision_scores(model, x_vector)[0])
+            calibrator = getattr(model, "calibrator_", None)
+            probability = float(calibrator.label_probability([label], [score])[0]) if calibrator is not None else None
+        self.log.info("Prediction Successful!!")
+        return {"cleaned": cleaned, "label": label, "score": score, "probability": probability}
+
+
+def _build_scorer(vector, model):
+    # models the scorer cannot reproduce keep going through sklearn
+    try:
+        return FastScorer.from_models(vector, model)
+    except (ValueError, AttributeError):
+        return None
@@ -0,0 +1,214 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    In-process LRU cache of predictions, bounded by entry count, memory and optionally age.
+    An alias maps another key to a cached entry, it takes the memory of its key but not of the value
+
+    Keyword arguments: max_entries=10000, max_bytes=32 MB, ttl=None
+
+    argument --
+        max_entries: Maximum number of cached entries.
+        max_bytes: Approximate memory the cached entries may take.
+        ttl: Seconds an entry stays valid, None for no expiry.
+
+    Return: None
+    """
+
+    _overhead = 200  # rough bytes of the tuples and the dict slot of one entry
+
+    def __init__(self, max_entries=10000, max_bytes=32 * 1024 * 1024, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expiry time, size, value)
+        self._aliases = OrderedDict()  # key -> (key of the entry, size)
+        self._bytes = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __repr__(self):
+        return f"PredictionCache({len(self._entries)}/{self.max_entries} entries)"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def validate(self, generation):
+        """
+        clears the cache when the models it was filled with have changed
+
+        Args:
+            generation (hashable): signature of the models currently served
+        """
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation != self._generation:
+                if self._generation is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._aliases.clear()
+                self._bytes = 0
+                self._generation = generation
+
+    def get(self, key, count_miss=True):
+        """
+        returns the cached value or None, a hit becomes the most recently used entry
+
+        Args:
+            key (hashable): cache key or alias
+            count_miss (bool, optional): Whether a miss counts in the stats, False when another lookup
+                follows it. Defaults to True.
+
+        Returns:
+            object: cached value or None
+        """
+        with self._lock:
+            alias = self._aliases.get(key)
+            if alias is not None:
+                self._aliases.move_to_end(key)
+                alias_key, key = key, alias[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                if alias is not None:
+                    self._remove_alias(alias_key)
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value, size=None):
+        """
+        stores a value and evicts the least recently used entries above the bounds
+
+        Args:
+            key (hashable): cache key
+            value (object): value to be cached
+            size (int, optional): bytes taken by the entry. Defaults to None: estimated from the key and value.
+        """
+        if size is None:
+            size = self._overhead + _text_size(key) + sum(_text_size(item) for item in value)
+        if size > self.max_bytes:
+            return
+        expiry = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expiry, size, value)
+            self._bytes += size
+            self._evict()
+
+    def alias(self, key, target):
+        """
+        makes key look up the entry of target, without storing the value twice,
+        the alias is dropped once that entry is evicted
+
+        Args:
+            key (hashable): alias key
+            target (hashable): key of a cached entry
+        """
+        size = self._overhead + _text_size(key)
+        if size > self.max_bytes or key == target:
+            return
+
+        with self._lock:
+            if key in self._aliases:
+                self._remove_alias(key)
+            if target not in self._entries:
+                return
+            self._aliases[key] = (target, size)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or (self._bytes > self.max_bytes and self._entries):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        # aliases of evicted entries, then the least recently used ones
+        while len(self._aliases) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove_alias(next(iter(self._aliases)))
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def _remove_alias(self, key):
+        self._bytes -= self._aliases.pop(key)[1]
+
+    def clear(self):
+        """removes every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self._bytes = 0
+
+    def reset_stats(self):
+        """sets the hit, miss, eviction and invalidation counters back to zero"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def stats(self):
+        """
+        returns the counters used to size the cache
+
+        Returns:
+            dict: entries, aliases, bytes, hits, misses, hit_rate, evictions and invalidations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "aliases": len(self._aliases),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _text_size(item):
+    if isinstance(item, tuple):
+        return sum(_text_size(part) for part in item)
+    return sys.getsizeof(item)
@@ -0,0 +1,245 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import gc
+import os
+import time
+import random
+import signal
+import socket
+import threading
+from waitress.server import create_server
+
+# importing custom packages
+from Logging.logger import Logging, close_all
+
+# seconds a worker gets to run its shutdown before it is ended anyway
+_EXIT_TIMEOUT = 15
+
+
+class PreforkServer:
+    """
+    Serves a WSGI app from several forked waitress processes sharing one listening socket.
+    The app and its models are loaded once in the parent, so the workers share them copy-on-write,
+    and every worker has its own GIL so scoring scales with the cores
+
+    Keyword arguments:
+        host="0.0.0.0",
+        port=8000,
+        workers=2,
+        threads=4,
+        preload=None,
+        max_requests=0,
+        max_requests_jitter=0,
+        graceful_timeout=30,
+        on_worker_exit=None,
+        log_folder_name="Prediction_Logs",
+        log_file_name="5-serving.txt"
+
+    argument --
+        app: the WSGI app.
+        host: interface to listen on.
+        port: port to listen on.
+        workers: number of worker processes.
+        threads: waitress threads in every worker.
+        preload: called once in the parent before forking, for example to load and warm up the models.
+        max_requests: a worker is recycled after this many requests, 0 for never.
+        max_requests_jitter: random extra requests per worker so they are not all recycled together.
+        graceful_timeout: seconds a stopping worker gets to finish its requests.
+        on_worker_exit: callables run by a worker before it exits, for example to send its queued mails,
+            the log files are flushed after them.
+        log_folder_name: Specifies the folder for the Logs.
+        log_file_name: Specifies the name of the log file.
+
+    Return: None
+    """
+
+    def __init__(self, app, host="0.0.0.0", port=8000, workers=2, threads=4, preload=None, max_requests=0,
+                 max_requests_jitter=0, graceful_timeout=30, on_worker_exit=None,
+                 log_folder_name="Prediction_Logs", log_file_name="5-serving.txt"):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.preload = preload
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.on_worker_exit = list(on_worker_exit or ())
+        self.log = Logging(os.path.join(log_folder_name, log_file_name))
+
+        self.socket = None
+        self._pids = dict()  # pid -> start time
+        self._stopping = False
+        self._recycling = False
+
+    def __repr__(self):
+        return f"PreforkServer({self.host}:{self.port}, workers={self.workers}, threads={self.threads})"
+
+    def run(self):
+        """
+        preloads, forks the workers and keeps them running until SIGTERM or SIGINT,
+        SIGHUP replaces every worker one by one without dropping requests
+        """
+        if self.preload:
+            self.preload()
+        # objects loaded so far are never touched by the collector again, so their pages stay shared
+        gc.collect()
+        gc.freeze()
+
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        self.log.info(f"Listening on {self.host}:{self.port} with {self.workers} workers x {self.threads} threads")
+        for _ in range(self.workers):
+            self._spawn()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_recycle)
+
+        while not self._stopping:
+            self._reap()
+            if self._recycling:
+                self._recycling = False
+                self._recycle_all()
+            time.sleep(0.5)
+        self._shutdown()
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_recycle(self, signum, frame):
+        self._recycling = True
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._serve_worker()
+            except Exception as e:
+                self.log.error(f"Worker {os.getpid()} crashed: {e}")
+                code = 1
+            finally:
+                self._exit_worker(code)
+        self._pids[pid] = time.monotonic()
+        self.log.info(f"Worker {pid} started")
+        return pid
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self._pids.pop(pid, None)
+            if started is None:
+                continue  # a recycled worker finished its last requests
+            if status:
+                self.log.warning(f"Worker {pid} exited with status {status}")
+            else:
+                self.log.info(f"Worker {pid} recycled")
+            if not self._stopping:
+                if time.monotonic() - started < 1:
+                    time.sleep(1)  # do not spin when workers die at startup
+                self._spawn()
+
+    def _recycle_all(self):
+        self.log.info("Recycling every worker")
+        for pid in list(self._pids):
+            # the replacement starts first so the capacity never drops
+            self._spawn()
+            self._pids.pop(pid, None)
+            self._signal(pid, signal.SIGTERM)
+
+    def _shutdown(self):
+        self.log.info("Stopping the workers")
+        for pid in list(self._pids):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._pids and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self._pids.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in list(self._pids):
+            self._signal(pid, signal.SIGKILL)
+        self.socket.close()
+
+    @staticmethod
+    def _signal(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _serve_worker(self):
+        for signum in (signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_IGN)
+        random.seed()
+        limit = self.max_requests + random.randint(0, self.max_requests_jitter) if self.max_requests else 0
+        served = [0]
+        lock = threading.Lock()
+        app = self.app
+
+        def counted_app(environ, start_response):
+            with lock:
+                served[0] += 1
+                recycle = limit and served[0] == limit
+            if recycle:
+                # finishes this request and the ones in flight, then the parent starts a fresh worker
+                os.kill(os.getpid(), signal.SIGTERM)
+            return app(environ, start_response)
+
+        server = create_server(counted_app, sockets=[self.socket], threads=self.threads)
+
+        def stop(signum, frame):
+            # stop accepting, the loop ends once the open connections are done
+            signal.alarm(self.graceful_timeout)
+            server.close()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGALRM, lambda signum, frame: self._exit_worker(0))
+        try:
+            server.run()
+        except OSError:
+            pass  # the listening socket was closed under the loop
+        server.task_dispatcher.shutdown(timeout=self.graceful_timeout)
+
+    def _exit_worker(self, code):
+        # os._exit skips the atexit handlers, so the worker runs its shutdown here,
+        # a last alarm ends it if a hook hangs
+        signal.signal(signal.SIGALRM, lambda signum, frame: os._exit(code))
+        signal.alarm(_EXIT_TIMEOUT)
+        for hook in self.on_worker_exit:
+            try:
+                hook()
+            except Exception as e:
+                self.log.error(f"Worker {os.getpid()} exit hook {hook!r} failed: {e}")
+        close_all()
+        os._exit(code)
@@ -0,0 +1,269 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# Every entry is a folder named by its key holding the CSR arrays of the vectorized corpus
+# (data.npy, indices.npy, indptr.npy), the labels (labels.npy), the fitted vectorizer
+# (vectorize.pickle) and meta.json. The rows are written in a shuffled order, so a train/test
+# split is two contiguous row ranges: slicing indptr gives CSR views of the memory mapped
+# arrays and nothing is copied.
+
+# importing libraries
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import sklearn
+
+# importing custom packages
+from Logging.logger import Logging
+
+FORMAT_VERSION = 1
+
+
+class FeatureStore:
+    """
+    Class to keep vectorized training corpora on disk, keyed by the hash of the cleaned reviews, the labels and
+    the vectorizer config, so a repeated training run maps the matrix back instead of fitting and transforming again
+
+    Keyword arguments:
+        store_folder_path="Training_Data/feature_store",
+        shuffle_seed=15,
+        max_entries=4,
+        max_bytes=8 GB,
+        log_folder_name="Training_Logs",
+        log_file_name="3-training_models.txt"
+
+    argument --
+        store_folder_path: Folder the entries are stored in.
+        shuffle_seed: seed of the row order of every entry.
+        max_entries: entries kept, the least recently used ones are removed by save above it, None for no limit.
+        max_bytes: disk space the entries may take, the least recently used ones are removed by save above it,
+            None for no limit.
+        log_folder_name: Specifies the folder for Training Logs.
+        log_file_name: Specifies the name of the log file.
+
+    Return: None
+    """
+
+    def __init__(self, store_folder_path=os.path.join("Training_Data", "feature_store"), shuffle_seed=15,
+                 max_entries=4, max_bytes=8 * 1024 ** 3,
+                 log_folder_name="Training_Logs", log_file_name="3-training_models.txt"):
+        self.store_folder_path = store_folder_path
+        self.shuffle_seed = shuffle_seed
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(store_folder_path, exist_ok=True)
+        self.log = Logging(os.path.join(log_folder_name, log_file_name))
+
+    def __repr__(self):
+        return f"FeatureStore({self.store_folder_path})"
+
+    def key(self, texts, y, vector_params=None):
+        """
+        returns the key of a corpus
+
+        Args:
+            texts (pandas.Series): cleaned reviews.
+            y (pandas.Series/array): labels.
+            vector_params (dict, optional): arguments of the TfidfVectorizer. Defaults to None.
+
+        Returns:
+            str: hex digest
+        """
+        digest = hashlib.sha1()
+        digest.update(pd.util.hash_pandas_object(pd.Series(texts), index=False).to_numpy().tobytes())
+        digest.update(pd.util.hash_pandas_object(pd.Series(np.asarray(y, dtype=str)), index=False).to_numpy().tobytes())
+        digest.update(json.dumps({"vector_params": vector_params or {}, "shuffle_seed": self.shuffle_seed,
+                                  "sklearn": sklearn.__version__, "version": FORMAT_VERSION},
+                                 sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.store_folder_path, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._path(key), "meta.json"))
+
+    def save(self, key, vector, x_vector, y):
+        """
+        writes a vectorized corpus in shuffled row order, the entry appears in one step once it is complete
+
+        Args:
+            key (str): output of key.
+            vector (TfidfVectorizer): fitted vector model.
+            x_vector (sparse_matrix): output of the vector model.
+            y (pandas.Series/array): labels.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            str: path of the entry
+        """
+        try:
+            x_vector = sp.csr_matrix(x_vector)
+            order = np.random.default_rng(self.shuffle_seed).permutation(x_vector.shape[0])
+            x_vector = x_vector[order]
+            x_vector.sort_indices()
+            labels = np.asarray(y, dtype=str)[order]
+
+            # every writer gets its own folder, so two runs saving the same corpus never share one
+            entry_path = self._path(key)
+            part_path = tempfile.mkdtemp(prefix=key + ".", suffix=".part", dir=self.store_folder_path)
+            try:
+                np.save(os.path.join(part_path, "data.npy"), x_vector.data)
+                np.save(os.path.join(part_path, "indices.npy"), x_vector.indices)
+                np.save(os.path.join(part_path, "indptr.npy"), x_vector.indptr)
+                np.save(os.path.join(part_path, "labels.npy"), labels)
+                with open(os.path.join(part_path, "vectorize.pickle"), "wb") as f:
+                    pickle.dump(vector, f)
+                with open(os.path.join(part_path, "meta.json"), "w") as f:
+                    json.dump({"shape": list(x_vector.shape), "nnz": int(x_vector.nnz),
+                               "shuffle_seed": self.shuffle_seed, "version": FORMAT_VERSION}, f)
+                try:
+                    os.rename(part_path, entry_path)
+                except OSError:
+                    if key not in self:
+                        raise
+                    # another run stored the same corpus first, the key makes both entries equal
+                    self.log.info(f"Feature store entry {key} already stored")
+                    return entry_path
+            finally:
+                shutil.rmtree(part_path, ignore_errors=True)
+
+            self.log.info(f"Feature store entry {key} Saved Successfully!! {x_vector.shape} nnz={x_vector.nnz}")
+            self._evict(keep=key)
+            return entry_path
+
+        except Exception as e:
+            self.log.error(f"function save: {e}")
+            raise Exception(e)
+
+    def _evict(self, keep):
+        # removes the least recently used entries above max_entries or max_bytes, never the one just saved
+        entries = list()
+        for entry in os.scandir(self.store_folder_path):
+            meta_path = os.path.join(entry.path, "meta.json")
+            if entry.name == keep or not entry.is_dir() or not os.path.exists(meta_path):
+                continue
+            size = sum(item.stat().st_size for item in os.scandir(entry.path))
+            entries.append((os.stat(meta_path).st_mtime, entry.name, size))
+        entries.sort()
+
+        kept_bytes = sum(size for _, _, size in entries) + sum(
+            item.stat().st_size for item in os.scandir(self._path(keep)))
+        kept_entries = len(entries) + 1
+        for _, name, size in entries:
+            if (self.max_entries is None or kept_entries <= self.max_entries) and \
+                    (self.max_bytes is None or kept_bytes <= self.max_bytes):
+                break
+            # renamed first so no reader finds a half deleted entry, open memory maps stay valid
+            doomed_path = tempfile.mkdtemp(prefix=name + ".", suffix=".evicted", dir=self.store_folder_path)
+            try:
+                os.replace(self._path(name), os.path.join(doomed_path, name))
+            except OSError:
+                continue  # already evicted by another run
+            finally:
+                shutil.rmtree(doomed_path, ignore_errors=True)
+            kept_entries -= 1
+            kept_bytes -= size
+            self.log.info(f"Feature store entry {name} evicted, {kept_entries} entries and {kept_bytes} bytes left")
+
+    def load(self, key):
+        """
+        maps a stored corpus back, the arrays are read only views of the files
+
+        Args:
+            key (str): output of key.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            (TfidfVectorizer, sparse_matrix, numpy.ndarray): vector model, x_vector and labels in the stored
+                (shuffled) row order, None if the key is not stored
+        """
+        try:
+            if key not in self:
+                return None
+            entry_path = self._path(key)
+            # the modification time of meta.json orders the entries for the eviction
+            os.utime(os.path.join(entry_path, "meta.json"))
+            with open(os.path.join(entry_path, "meta.json")) as f:
+                meta = json.load(f)
+            with open(os.path.join(entry_path, "vectorize.pickle"), "rb") as f:
+                vector = pickle.load(f)
+            arrays = {name: np.load(os.path.join(entry_path, f"{name}.npy"), mmap_mode="r")
+                      for name in ("data", "indices", "indptr", "labels")}
+            x_vector = sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                                     shape=tuple(meta["shape"]), copy=False)
+            self.log.info(f"Feature store entry {key} Loaded Successfully!! {x_vector.shape}")
+            return vector, x_vector, arrays["labels"]
+
+        except Exception as e:
+            self.log.error(f"function load: {e}")
+            raise Exception(e)
+
+
+def row_slice(x_vector, start, stop):
+    """
+    returns rows start:stop of a CSR matrix as a view, its data and indices are not copied
+
+    Args:
+        x_vector (scipy.sparse.csr_matrix): matrix with sorted indices.
+        start (int): first row.
+        stop (int): row after the last row.
+
+    Returns:
+        scipy.sparse.csr_matrix: the rows
+    """
+    indptr = x_vector.indptr[start:stop + 1]
+    low, high = int(indptr[0]), int(indptr[-1])
+    data, indices = x_vector.data[low:high], x_vector.indices[low:high]
+    view = sp.csr_matrix((data, indices, indptr - low), shape=(stop - start, x_vector.shape[1]), copy=False)
+    # the constructor copies a view much smaller than its base array (scipy's prune), put the views back
+    view.data, view.indices = data, indices
+    view.has_sorted_indices = True
+    return view
+
+
+def contiguous_split(x_vector, y, test_size=0.25):
+    """
+    splits rows that are already in random order into the leading train rows and the trailing test rows,
+    without copying the matrix
+
+    Args:
+        x_vector (scipy.sparse.csr_matrix): matrix in shuffled row order.
+        y (numpy.ndarray): labels in the same order.
+        test_size (float, optional): fraction of test rows. Defaults to 0.25.
+
+    Returns:
+        (sparse_matrix, sparse_matrix, numpy.ndarray, numpy.ndarray): x_train, x_test, y_train, y_test
+    """
+    n_rows = x_vector.shape[0]
+    n_train = n_rows - int(np.ceil(n_rows * test_size))
+    return (row_slice(x_vector, 0, n_train), row_slice(x_vector, n_train, n_rows),
+            y[:n_train], y[n_train:])
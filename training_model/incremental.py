@@ -0,0 +1,235 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import os
+import joblib
+import numpy as np
+from sklearn.preprocessing import normalize
+from sklearn.linear_model import SGDClassifier
+from sklearn.feature_extraction.text import HashingVectorizer
+
+# importing custom packages
+from Logging.logger import Logging
+from data_import.data_input import DataInput
+
+
+class IncrementalTrainingAPI:
+    """
+    Class to train a linear model out of core, one chunk at a time, and to keep updating a saved model
+    with new labelled reviews without refitting from scratch
+
+    Keyword arguments:
+        training_folder_path="Training_Data",
+        model_name="sgd_model.sav",
+        n_features=2**20,
+        use_tfidf=True,
+        classes=("negative", "positive"),
+        log_folder_name="Training_Logs",
+        log_file_name="3-training_models.txt"
+
+    argument --
+        training_folder_path: Folder path where models are stored.
+        model_name: name of the saved model inside the training folder.
+        n_features: number of hashed features, the vectorizer itself keeps no vocabulary.
+        use_tfidf: Whether to weight the hashed counts by idf computed from the documents seen so far.
+        classes: every label the model can predict, needed by partial_fit.
+        log_folder_name: Specifies the folder for Training Logs.
+        log_file_name: Specifies the name of the log file.
+
+    Return: None
+    """
+
+    def __init__(self, training_folder_path="Training_Data", model_name="sgd_model.sav", n_features=2**20,
+                 use_tfidf=True, classes=("negative", "positive"),
+                 log_folder_name="Training_Logs", log_file_name="3-training_models.txt"):
+        self.training_folder_path = training_folder_path
+        os.makedirs(training_folder_path, exist_ok=True)
+        self.model_path = os.path.join(training_folder_path, model_name)
+        self.log = Logging(os.path.join(log_folder_name, log_file_name))
+
+        self.classes = np.array(classes)
+        self.use_tfidf = use_tfidf
+        self.vector = HashingVectorizer(n_features=n_features, alternate_sign=False,
+                                        norm=None if use_tfidf else "l2")
+        self.model = SGDClassifier(loss="hinge", alpha=1e-5, random_state=15)
+        # document frequencies of every hashed feature, the idf follows the documents seen so far
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+
+    def __repr__(self):
+        return f"IncrementalTrainingAPI({self.model_path}, {self.n_docs} documents seen)"
+
+    def _idf(self):
+        # same smoothing as sklearn's TfidfTransformer
+        return np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1
+
+    def transform(self, x, update_idf=False):
+        """
+        vectorizes cleaned reviews with the hashing vectorizer and the idf weights
+
+        Args:
+            x (iterable): cleaned reviews
+            update_idf (bool, optional): Whether to add these reviews to the document frequencies first. Defaults to False.
+
+        Returns:
+            sparse matrix: sparse matrix of transformed values
+        """
+        x_vector = self.vector.transform(x)
+        if not self.use_tfidf:
+            return x_vector
+
+        if update_idf:
+            self.doc_freq += np.bincount(x_vector.indices, minlength=self.doc_freq.shape[0])
+            self.n_docs += x_vector.shape[0]
+        return normalize(x_vector.multiply(self._idf()).tocsr())
+
+    def partial_fit_chunks(self, chunks, label_col="sentiment", cleaner=None, n_jobs=1):
+        """
+        updates the model with every chunk in turn, each chunk is scored before being learnt
+        so the logged accuracy is an honest estimate on unseen reviews
+
+        Args:
+            chunks (iterable): pandas DataFrames with the review as the first column and the label column.
+            label_col (str, optional): name of the label column. Defaults to "sentiment".
+            cleaner (Cleaner, optional): Cleaner used for raw chunks, None if the chunks are already cleaned. Defaults to None.
+            n_jobs (int, optional): Number of processes used for cleaning. Defaults to 1.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            dict: rows learnt and progressive validation accuracy
+        """
+        try:
+            self.log.info("Entered function partial_fit_chunks")
+            rows = 0
+            scored = 0
+            correct = 0
+            for chunk_number, df in enumerate(chunks, start=1):
+                if cleaner is not None:
+                    df = cleaner.ret_cleaned_dataframe(df, n_jobs=n_jobs)
+                x = df[df.columns[0]]
+                y = df[label_col].to_numpy()
+
+                x_vector = self.transform(x, update_idf=True)
+                if hasattr(self.model, "coef_"):
+                    correct += int((self.model.predict(x_vector) == y).sum())
+                    scored += len(y)
+
+                self.model.partial_fit(x_vector, y, classes=self.classes)
+                rows += len(y)
+                self.log.info(f"Chunk {chunk_number} learnt, {rows} rows done!!")
+
+            accuracy = correct / scored if scored else None
+            if accuracy is not None:
+                self.log.info(f"Progressive validation accuracy: {accuracy:.3f} on {scored} rows")
+            return {"rows": rows, "progressive_accuracy": accuracy}
+
+        except Exception as e:
+            self.log.error(f"Function partial_fit_chunks: {e}")
+            raise Exception(e)
+
+    def train_from_csv(self, csv_path, cleaner, chunksize=10000, label_col="sentiment", update=False,
+                       n_jobs=1, folder_save=True):
+        """
+        trains on a csv file read in chunks, memory stays bounded whatever the file size
+
+        Args:
+            csv_path (str/path): raw labelled reviews, the review is the first column.
+            cleaner (Cleaner): Cleaner used for every chunk.
+            chunksize (int, optional): number of rows read and learnt at a time. Defaults to 10000.
+            label_col (str, optional): name of the label column. Defaults to "sentiment".
+            update (bool, optional): Whether to continue from the saved model instead of starting from zero. Defaults to False.
+            n_jobs (int, optional): Number of processes used for cleaning. Defaults to 1.
+            folder_save (bool, optional): Whether to save the model or not. Defaults to True.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            dict: rows learnt and progressive validation accuracy
+        """
+        try:
+            if update and os.path.exists(self.model_path):
+                self.load()
+
+            data_input = DataInput(os.path.dirname(self.log.file_path), "1-file_input.txt")
+            result = self.partial_fit_chunks(data_input.ret_dataframe_chunks(csv_path, chunksize),
+                                             label_col=label_col, cleaner=cleaner, n_jobs=n_jobs)
+            if folder_save:
+                self.save()
+            return result
+
+        except Exception as e:
+            self.log.error(f"Function train_from_csv: {e}")
+            raise Exception(e)
+
+    def predict(self, x):
+        """
+        predicts cleaned reviews
+
+        Args:
+            x (iterable): cleaned reviews
+
+        Returns:
+            numpy.ndarray: predicted labels
+        """
+        return self.model.predict(self.transform(x))
+
+    def save(self):
+        """
+        saves the vectorizer, the document frequencies and the model together
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+        """
+        try:
+            state = {"vector": self.vector, "use_tfidf": self.use_tfidf, "doc_freq": self.doc_freq,
+                     "n_docs": self.n_docs, "classes": self.classes, "model": self.model}
+            # replaced in one step so a reader never loads a half written model
+            part_path = self.model_path + ".part"
+            joblib.dump(state, part_path)
+            os.replace(part_path, self.model_path)
+            self.log.info(f"Incremental Model Saved Successfully at {self.model_path}!!!")
+        except Exception as e:
+            self.log.error(f"Function save: {e}")
+            raise Exception(e)
+
+    def load(self):
+        """
+        loads the saved state to keep updating it
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+        """
+        try:
+            state = joblib.load(self.model_path)
+            self.vector = state["vector"]
+            self.use_tfidf = state["use_tfidf"]
+            self.doc_freq = state["doc_freq"]
+            self.n_docs = state["n_docs"]
+            self.classes = state["classes"]
+            self.model = state["model"]
+            self.log.info(f"Incremental Model Loaded from {self.model_path}, {self.n_docs} documents seen")
+        except Exception as e:
+            self.log.error(f"Function load: {e}")
+            raise Exception(e)
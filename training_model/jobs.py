@@ -0,0 +1,299 @@
+"""
+Copyright (c) 2021 Rishabh Kalra <rishabhkalra1501@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# importing libraries
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+from functools import partial
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# importing custom packages
+from Logging.logger import Logging
+from model_registry.registry import model_registry
+
+
+def run_training_job(input_csv_path, staging_folder_path, n_jobs=-1, use_cache=True,
+                     review_col="review", label_col="sentiment", dedup=True, calibration="sigmoid"):
+    """
+    runs DataInput, Cleaner and TrainingAPI end to end, saving the models in the staging folder,
+    runs inside a worker process of the TrainingJobRunner
+
+    Args:
+        input_csv_path (str/path): raw labelled reviews, CSV, JSONL or Parquet, see DataInput.ret_dataset.
+        staging_folder_path (str/path): folder the new models are written to.
+        n_jobs (int, optional): Number of processes used for cleaning. Defaults to -1.
+        use_cache (bool, optional): Whether to use the cleaned review cache and the feature store. Defaults to True.
+        review_col (str, optional): name of the review column. Defaults to "review".
+        label_col (str, optional): name of the label column. Defaults to "sentiment".
+        dedup (bool, optional): Whether to collapse duplicate reviews before vectorizing. Defaults to True.
+        calibration (str, optional): calibration of the served probabilities, "sigmoid", "isotonic" or None,
+            see TrainingAPI.train_model. Defaults to "sigmoid".
+
+    Returns:
+        dict: metrics of the trained model
+    """
+    # imported here so the serving process does not pay for them
+    from data_import.data_input import DataInput
+    from data_cleaning.data_cleaning import Cleaner
+    from data_cleaning.cleaning_cache import CleanedReviewCache
+    from data_cleaning.deduplication import Deduplicator
+    from training_model.training import TrainingAPI
+    from training_model.feature_store import FeatureStore
+
+    data_input = DataInput()
+    cleaner = Cleaner()
+    cache = None
+    feature_store = None
+    if use_cache:
+        cache = CleanedReviewCache(os.path.join("Cleaned_Csv_Files", "cleaned_cache.sqlite3"),
+                                   namespace=cleaner.fingerprint())
+        feature_store = FeatureStore(os.path.join("Training_Data", "feature_store"))
+    try:
+        df = data_input.ret_dataset(input_csv_path, review_col=review_col, label_col=label_col)
+        train = TrainingAPI(training_folder_path=staging_folder_path)
+        train.run_pipeline(df, cleaner, label_col=label_col, n_jobs=n_jobs, cache=cache,
+                           deduplicator=Deduplicator() if dedup else None, feature_store=feature_store,
+                           calibration=calibration)
+        train.export_artifact()
+        return train.metrics
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def _run_queued_job(jobs_path, job_id, slots_folder_path, slots, *args, **kwargs):
+    # waits for a free slot shared by every serving process, so prefork workers never train more than
+    # max_workers jobs at once between them
+    slot = _acquire_slot(slots_folder_path, slots)
+    try:
+        with closing(_connect(jobs_path)) as connection:
+            connection.execute("UPDATE jobs SET status = 'running' WHERE job_id = ?", (job_id,))
+            connection.commit()
+        return run_training_job(*args, **kwargs)
+    finally:
+        if slot is not None:
+            os.close(slot)
+
+
+def _acquire_slot(slots_folder_path, slots):
+    if fcntl is None:
+        return None  # no fork on this platform, so a single process holds every job
+    os.makedirs(slots_folder_path, exist_ok=True)
+    while True:
+        for i in range(slots):
+            fd = os.open(os.path.join(slots_folder_path, f"slot-{i}.lock"), os.O_RDWR | os.O_CREAT)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        time.sleep(1)
+
+
+def _connect(jobs_path):
+    connection = sqlite3.connect(jobs_path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                              job_id TEXT PRIMARY KEY,
+                              input_csv_path TEXT NOT NULL,
+                              status TEXT NOT NULL,
+                              submitted TEXT NOT NULL,
+                              finished TEXT,
+                              metrics TEXT,
+                              error TEXT,
+                              pid INTEGER NOT NULL)""")
+    connection.commit()
+    return connection
+
+
+class TrainingJobRunner:
+    """
+    Class to run training jobs in a background process and swap the new models in once they are done,
+    so /train returns at once and never ties up a serving thread.
+    The jobs are kept in a sqlite table and the running jobs hold lock files, so every prefork worker
+    reports the same jobs and they never train more than max_workers jobs at once between them
+
+    Keyword arguments:
+        training_folder_path="Training_Data",
+        max_workers=1,
+        jobs_path="Training_Data/training_jobs.sqlite3",
+        log_folder_name="Training_Logs",
+        log_file_name="4-training_jobs.txt"
+
+    argument --
+        training_folder_path: Folder path where the served models are stored.
+        max_workers: Number of training jobs running at the same time, across every serving process.
+        jobs_path: path of the sqlite file holding the jobs.
+        log_folder_name: Specifies the folder for Training Logs.
+        log_file_name: Specifies the name of the log file.
+
+    Return: None
+    """
+
+    def __init__(self, training_folder_path="Training_Data", max_workers=1,
+                 jobs_path=os.path.join("Training_Data", "training_jobs.sqlite3"),
+                 log_folder_name="Training_Logs", log_file_name="4-training_jobs.txt"):
+        self.training_folder_path = training_folder_path
+        self.max_workers = max_workers
+        self.jobs_path = jobs_path
+        self.log = Logging(os.path.join(log_folder_name, log_file_name))
+        self._executor = None
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"TrainingJobRunner({self.jobs_path})"
+
+    def _execute(self, query, parameters=()):
+        with self._lock:
+            # a connection is never shared with a forked process
+            if self._pid != os.getpid():
+                folder = os.path.dirname(self.jobs_path)
+                if folder:
+                    os.makedirs(folder, exist_ok=True)
+                self._connection = _connect(self.jobs_path)
+                self._executor = None
+                self._pid = os.getpid()
+            rows = self._connection.execute(query, parameters).fetchall()
+            self._connection.commit()
+            return rows
+
+    def submit(self, input_csv_path, n_jobs=-1, use_cache=True, review_col="review", label_col="sentiment",
+               dedup=True, calibration="sigmoid"):
+        """
+        queues a training job
+
+        Args:
+            input_csv_path (str/path): raw labelled reviews, CSV, JSONL or Parquet.
+            n_jobs (int, optional): Number of processes used for cleaning. Defaults to -1.
+            use_cache (bool, optional): Whether to use the cleaned review cache and the feature store. Defaults to True.
+            review_col (str, optional): name of the review column. Defaults to "review".
+            label_col (str, optional): name of the label column. Defaults to "sentiment".
+            dedup (bool, optional): Whether to collapse duplicate reviews before vectorizing. Defaults to True.
+            calibration (str, optional): "sigmoid", "isotonic" or None, see run_training_job. Defaults to "sigmoid".
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            str: id of the job
+        """
+        try:
+            job_id = uuid.uuid4().hex
+            staging_folder_path = os.path.join(self.training_folder_path, "staging", job_id)
+            self._execute("INSERT INTO jobs (job_id, input_csv_path, status, submitted, pid) VALUES (?, ?, ?, ?, ?)",
+                          (job_id, str(input_csv_path), "queued", datetime.now().isoformat(), os.getpid()))
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                future = self._executor.submit(_run_queued_job, self.jobs_path, job_id,
+                                               os.path.join(self.training_folder_path, "staging"),
+                                               self.max_workers, input_csv_path, staging_folder_path,
+                                               n_jobs=n_jobs, use_cache=use_cache,
+                                               review_col=review_col, label_col=label_col, dedup=dedup,
+                                               calibration=calibration)
+            future.add_done_callback(partial(self._finish, job_id, staging_folder_path))
+            self.log.info(f"Training job {job_id} queued for {input_csv_path}")
+            return job_id
+
+        except Exception as e:
+            self.log.error(f"function submit: {e}")
+            raise Exception(e)
+
+    def _finish(self, job_id, staging_folder_path, future):
+        try:
+            metrics = future.result()
+            # the serving workers only ever see complete files
+            model_registry.install_files([
+                (os.path.join(staging_folder_path, name), os.path.join(self.training_folder_path, name))
+                for name in ("svc_model.sav", "vectorize.pickle", "model.artifact", "stem_table.pickle")])
+            self._execute("UPDATE jobs SET status = 'finished', metrics = ?, finished = ? WHERE job_id = ?",
+                          (json.dumps(metrics), datetime.now().isoformat(), job_id))
+            self.log.info(f"Training job {job_id} finished: F1 weighted={metrics['f1_weighted']:.2f}")
+        except Exception as e:
+            self._execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE job_id = ?",
+                          (str(e), datetime.now().isoformat(), job_id))
+            self.log.error(f"Training job {job_id} failed: {e}")
+        finally:
+            shutil.rmtree(staging_folder_path, ignore_errors=True)
+
+    @staticmethod
+    def _row_to_job(row):
+        job_id, input_csv_path, status, submitted, finished, metrics, error, pid = row
+        if status in ("queued", "running") and not _alive(pid):
+            # the serving process that ran the job was recycled or crashed
+            status, error = "failed", f"process {pid} exited before the job finished"
+        return {"job_id": job_id, "input_csv_path": input_csv_path, "status": status, "submitted": submitted,
+                "finished": finished, "metrics": json.loads(metrics) if metrics else None, "error": error}
+
+    def status(self, job_id):
+        """
+        returns the state of a job
+
+        Args:
+            job_id (str): id returned by submit
+
+        Returns:
+            dict: job state, None for an unknown job
+        """
+        rows = self._execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        return self._row_to_job(rows[0]) if rows else None
+
+    def jobs(self):
+        """
+        returns the state of every job
+
+        Returns:
+            list: job states, oldest first
+        """
+        return [self._row_to_job(row) for row in self._execute("SELECT * FROM jobs ORDER BY submitted")]
+
+    def shutdown(self, wait=True):
+        """
+        stops the worker process
+
+        Args:
+            wait (bool, optional): Whether to wait for the running jobs. Defaults to True.
+        """
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -22,16 +22,38 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 # importing libraries
 import os
 import pickle
+import json
+import time
 import joblib
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+from joblib import Parallel, delayed
+from sklearn.base import clone
 from sklearn.svm import LinearSVC
 from sklearn.naive_bayes import MultinomialNB
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, StratifiedKFold
+from sklearn.feature_selection import chi2
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics import confusion_matrix, classification_report, f1_score
 
 # importing custom packages
 from Logging.logger import Logging
+from instrumentation.metrics import timed
+from model_registry.artifact import export_artifact
+from model_registry.registry import vector_fingerprint
+from model_registry.calibration import ScoreCalibrator, decision_scores, calibration_error
+from training_model.feature_store import contiguous_split, row_slice
+
+# candidates of TrainingAPI.sweep
+MODELS = {"LinearSVC": LinearSVC, "MultinomialNB": MultinomialNB}
+DEFAULT_VECTOR_GRID = [
+    {"ngram_range": (1, 1), "max_features": None},
+    {"ngram_range": (1, 1), "max_features": 50000},
+    {"ngram_range": (1, 2), "max_features": 200000},
+]
+DEFAULT_MODEL_GRID = [("LinearSVC", {"C": c}) for c in (0.1, 0.5, 1.0, 2.0)] + \
+                     [("MultinomialNB", {"alpha": alpha}) for alpha in (0.1, 0.5, 1.0)]
 
 
 class TrainingAPI:
@@ -58,8 +80,7 @@ class TrainingAPI:
                  log_folder_name="Training_Logs", log_file_name="3-training_models.txt"):
 
         self.training_folder_path = training_folder_path
-        if training_folder_path not in os.listdir():
-            os.mkdir(training_folder_path)
+        os.makedirs(training_folder_path, exist_ok=True)
 
         if not cleaned_csv_path:
             self.cleaned_csv_path = os.path.join("Cleaned_Csv_Files","cleaned_data.csv")
@@ -67,9 +88,13 @@ class TrainingAPI:
             self.cleaned_csv_path = cleaned_csv_path
 
         self.log = Logging(os.path.join(log_folder_name, log_file_name))
+        # scores of the last train_model call and the vector model of the last vectorize call
+        self.metrics = dict()
+        self.vector = None
 
+    @timed("training.vectorize")
     def vectorize(self, cleaned_csv_path=None, vector_model_name="vectorize.pickle",
-                  vector_save_path=None, folder_save=True):
+                  vector_save_path=None, folder_save=True, data=None, vector_params=None):
         """Function to create and save the vector model
 
         Args:
@@ -77,6 +102,8 @@ class TrainingAPI:
             vector_model_name (str, optional): Name of the vector model. Defaults to "vectorize.pickle".
             vector_save_path (str/path, optional): path to save vector model. Defaults to None.
             folder_save (bool, optional): Whether to save the model or not, True->save the model, False->don't save the model. Defaults to True.
+            data (pandas.Series/pandas.DataFrame, optional): cleaned data already in memory, used instead of the csv. Defaults to None.
+            vector_params (dict, optional): arguments of the TfidfVectorizer, for example ngram_range. Defaults to None.
 
         Raises:
             Exception: any Exception, check logs for specifics
@@ -86,20 +113,25 @@ class TrainingAPI:
         """
         try:
             self.log.info("Entered function vectorize!")
-            if not cleaned_csv_path:
-                cleaned_csv_path = self.cleaned_csv_path
-                self.log.info("Using Default CSV File")
+            if data is not None:
+                x = data if isinstance(data, pd.Series) else data[data.columns[0]]
+                self.log.info("Using In-Memory Data")
             else:
-                self.log.info("Using User Provided CSV File")
+                if not cleaned_csv_path:
+                    cleaned_csv_path = self.cleaned_csv_path
+                    self.log.info("Using Default CSV File")
+                else:
+                    self.log.info("Using User Provided CSV File")
 
-            df = pd.read_csv(cleaned_csv_path)
-            df_cols = df.columns
-            x = df[df_cols[0]]
+                df = pd.read_csv(cleaned_csv_path)
+                df_cols = df.columns
+                x = df[df_cols[0]]
 
             self.log.info("Making a TfidfVectorizer Model")
-            vector = TfidfVectorizer()
+            vector = TfidfVectorizer(**(vector_params or {}))
             self.log.info("Fitting the TfidfVectorizer Model")
             vector.fit(x)
+            self.vector = vector
 
             if folder_save:
                 if vector_save_path:
@@ -121,7 +153,9 @@ class TrainingAPI:
             self.log.error(f"Function vectorize: {e}")
             raise Exception(e)
 
-    def train_model(self, x_vector, y, train_model_name="svc_model.sav", model_save_path=None, folder_save=True):
+    @timed("training.train_model")
+    def train_model(self, x_vector, y, train_model_name="svc_model.sav", model_save_path=None, folder_save=True,
+                    model=None, calibration=None, calibration_size=None, calibration_cv=5):
         """Function to train the model and save it
 
         Args:
@@ -130,6 +164,13 @@ class TrainingAPI:
             train_model_name (str, optional): name of the model. Defaults to "svc_model.sav".
             model_save_path (str/path, optional): path to save the model. Defaults to None.
             folder_save (bool, optional): Whether to save the model or not, True->save the model, False->don't save the model. Defaults to True.
+            model (object, optional): unfitted sklearn classifier. Defaults to None: LinearSVC().
+            calibration (str, optional): "sigmoid" or "isotonic" to fit calibrated probabilities on out of fold scores
+                of the training data, saved with the model as calibrator_, cross-fitting fits the model calibration_cv
+                more times. Defaults to None: no probabilities.
+            calibration_size (float, optional): fraction of the training data held out of the fit for calibration
+                instead of cross-fitting. Defaults to None: the model is fitted on all the training data.
+            calibration_cv (int, optional): folds of the cross-fitted calibration. Defaults to 5.
 
         Raises:
             Exception: any Exception, check logs for specifics
@@ -144,10 +185,78 @@ class TrainingAPI:
             x_train, x_test, y_train, y_test = train_test_split(x_vector, y, test_size=0.25, random_state=15)
             self.log.info("Split the data in train and test")
 
-            model = LinearSVC()
+            return self.train_model_on_split(x_train, x_test, y_train, y_test, train_model_name=train_model_name,
+                                             model_save_path=model_save_path, folder_save=folder_save, model=model,
+                                             calibration=calibration, calibration_size=calibration_size,
+                                             calibration_cv=calibration_cv)
+
+        except Exception as e:
+            self.log.error(f"Function train_model: {e}")
+            raise Exception(e)
+
+    @timed("training.train_model_on_split")
+    def train_model_on_split(self, x_train, x_test, y_train, y_test, train_model_name="svc_model.sav",
+                             model_save_path=None, folder_save=True, model=None, calibration=None,
+                             calibration_size=None, calibration_cv=5, shuffled=False):
+        """Function to train the model on an existing train/test split, save it and score it on the test rows
+
+        Args:
+            x_train (sparse_matrix): training rows of the vector model output.
+            x_test (sparse_matrix): test rows of the vector model output.
+            y_train (array): labels of the training rows.
+            y_test (array): labels of the test rows.
+            train_model_name (str, optional): name of the model. Defaults to "svc_model.sav".
+            model_save_path (str/path, optional): path to save the model. Defaults to None.
+            folder_save (bool, optional): Whether to save the model or not, True->save the model, False->don't save the model. Defaults to True.
+            model (object, optional): unfitted sklearn classifier. Defaults to None: LinearSVC().
+            calibration (str, optional): "sigmoid", "isotonic" or None, see train_model. Defaults to None.
+            calibration_size (float, optional): fraction of the training data held out for calibration, see train_model.
+                Defaults to None: cross-fitted.
+            calibration_cv (int, optional): folds of the cross-fitted calibration. Defaults to 5.
+            shuffled (bool, optional): Whether the training rows are already in random order (a FeatureStore split),
+                then the held out calibration rows are the trailing rows and no matrix is copied. Defaults to False.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            (str,str): confusion_matrix , classification_report
+        """
+        try:
+            model = model if model is not None else LinearSVC()
+            calibrate = calibration is not None and pd.Series(np.concatenate([y_train, y_test])).nunique() == 2
+            if calibration is not None and not calibrate:
+                self.log.warning("Calibration needs two classes, the model is saved without probabilities")
+            if calibrate and calibration_size is None:
+                # scores on rows the model was fitted on are overconfident, so every training row is scored by
+                # a fold model that did not see it and the served model is still fitted on all of them
+                cal_scores, y_cal = self._out_of_fold_scores(model, x_train, y_train, calibration_cv), y_train
+                if cal_scores is None:
+                    self.log.warning("A calibration fold misses a class, the model is saved without probabilities")
+                    calibrate = False
+            elif calibrate:
+                # the calibration rows are held out of the fit
+                split = None
+                if shuffled:
+                    split = contiguous_split(x_train, y_train, test_size=calibration_size)
+                    if pd.Series(split[2]).nunique() < 2 or pd.Series(split[3]).nunique() < 2:
+                        # the trailing rows are not stratified, a small or skewed corpus can leave a class out
+                        self.log.warning("Trailing calibration rows miss a class, using a stratified split")
+                        split = None
+                if split is None:
+                    split = train_test_split(x_train, y_train, test_size=calibration_size,
+                                             random_state=15, stratify=y_train)
+                x_train, x_cal, y_train, y_cal = split
             model.fit(x_train, y_train)
             self.log.info("Created the model and fitted it to train data")
 
+            if calibrate:
+                if calibration_size is not None:
+                    cal_scores = decision_scores(model, x_cal)
+                model.calibrator_ = ScoreCalibrator(calibration).fit(cal_scores, y_cal, model.classes_)
+                self.log.info(f"Fitted {calibration} calibration on {len(y_cal)} "
+                              f"{'held out' if calibration_size is not None else 'out of fold'} rows")
+
             if folder_save:
                 if model_save_path:
                     save_path = os.path.join(model_save_path, train_model_name)
@@ -156,6 +265,9 @@ class TrainingAPI:
                     save_path = os.path.join(self.training_folder_path, train_model_name)
                     self.log.info(f"Saving Model at Default Path: {save_path}")
 
+                if len(getattr(self.vector, "vocabulary_", ())) == x_train.shape[1]:
+                    # the registry refuses to serve the model with any other vector model
+                    model.vector_fingerprint_ = vector_fingerprint(self.vector)
                 joblib.dump(model, save_path)
                 self.log.info("Model Saved Successfully!!!")
 
@@ -168,9 +280,447 @@ class TrainingAPI:
             f1 = f1_score(y_test, y_predict, average="weighted")
             self.log.info(
                 f"Successfully Predicted with test data: F1 scores-> positive={f1_pos:.2f} negative={f1_neg:.2f} Weighted={f1:.2f}")
+            self.metrics = {"labels": [str(label) for label in model.classes_],
+                            "confusion_matrix": confusion_matrix(y_test, y_predict, labels=model.classes_).tolist(),
+                            "f1_positive": f1_pos, "f1_negative": f1_neg, "f1_weighted": f1,
+                            "classification_report": cl_report}
+            if calibrate:
+                probabilities = model.calibrator_.predict_proba(decision_scores(model, x_test))
+                positive = np.asarray(y_test) == model.classes_[1]
+                self.metrics["calibration"] = {
+                    "method": calibration, "rows": int(len(y_cal)),
+                    "cv": calibration_cv if calibration_size is None else None,
+                    "brier": float(np.mean((probabilities - positive) ** 2)),
+                    "ece": calibration_error(probabilities, positive)}
+                self.log.info(f"Calibration on test data: Brier={self.metrics['calibration']['brier']:.4f} "
+                              f"ECE={self.metrics['calibration']['ece']:.4f}")
 
             return cm, cl_report
 
         except Exception as e:
-            self.log.error(f"Function train_model: {e}")
+            self.log.error(f"Function train_model_on_split: {e}")
+            raise Exception(e)
+
+    def _out_of_fold_scores(self, model, x_train, y_train, cv):
+        # decision scores of every training row from a clone of the model fitted on the other folds, the training
+        # rows are already in random order (train_test_split or a FeatureStore entry) so the folds are contiguous
+        # slices: the scored fold is a view and only the fitted rows are copied once by vstack
+        x_train = sp.csr_matrix(x_train)
+        if not x_train.has_sorted_indices:
+            x_train = x_train.sorted_indices()
+        y_train = np.asarray(y_train)
+        n_rows = len(y_train)
+        scores = np.empty(n_rows, dtype=np.float64)
+        bounds = np.linspace(0, n_rows, cv + 1).astype(int)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            y_fit = np.concatenate([y_train[:start], y_train[stop:]])
+            if np.unique(y_fit).size < 2:
+                return None
+            x_fit = sp.vstack([row_slice(x_train, 0, start), row_slice(x_train, stop, n_rows)], format="csr")
+            fold_model = clone(model).fit(x_fit, y_fit)
+            del x_fit
+            scores[start:stop] = decision_scores(fold_model, row_slice(x_train, start, stop))
+        return scores
+
+    @timed("training.train_from_feature_store")
+    def train_from_feature_store(self, data, y, feature_store, vector_params=None, vector_model_name="vectorize.pickle",
+                                 train_model_name="svc_model.sav", folder_save=True, test_size=0.25, model=None,
+                                 calibration=None):
+        """Trains from the FeatureStore entry of the corpus, the corpus is vectorized and stored first if it has
+        no entry yet. The stored rows are shuffled, so the train and test rows are views of the memory mapped
+        matrix and repeated runs on the same corpus skip vectorizing entirely.
+
+        Args:
+            data (pandas.Series/pandas.DataFrame): cleaned reviews, the first column for a DataFrame.
+            y (pandas.Series): labels.
+            feature_store (FeatureStore): where the vectorized corpora are kept.
+            vector_params (dict, optional): arguments of the TfidfVectorizer. Defaults to None.
+            vector_model_name (str, optional): Name of the vector model. Defaults to "vectorize.pickle".
+            train_model_name (str, optional): name of the model. Defaults to "svc_model.sav".
+            folder_save (bool, optional): Whether to save the vector model and the model. Defaults to True.
+            test_size (float, optional): fraction of test rows. Defaults to 0.25.
+            model (object, optional): unfitted sklearn classifier. Defaults to None: LinearSVC().
+            calibration (str, optional): "sigmoid", "isotonic" or None, see train_model. Defaults to None.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            (str,str): confusion_matrix , classification_report
+        """
+        try:
+            self.log.info("Entered function train_from_feature_store")
+            x = data if isinstance(data, pd.Series) else data[data.columns[0]]
+            key = feature_store.key(x, y, vector_params)
+
+            stored = feature_store.load(key)
+            if stored is None:
+                self.log.info(f"Corpus {key} not in the feature store, vectorizing it")
+                x_vector = self.vectorize(data=x, vector_params=vector_params, folder_save=False)
+                feature_store.save(key, self.vector, x_vector, y)
+                del x_vector
+                stored = feature_store.load(key)
+            else:
+                self.log.info(f"Corpus {key} found in the feature store, skipping vectorize")
+            self.vector, x_vector, labels = stored
+
+            if folder_save:
+                with open(os.path.join(self.training_folder_path, vector_model_name), 'wb') as f:
+                    pickle.dump(self.vector, f)
+                self.log.info("Vector Model Saved Successfully!!!")
+
+            x_train, x_test, y_train, y_test = contiguous_split(x_vector, labels, test_size=test_size)
+            return self.train_model_on_split(x_train, x_test, y_train, y_test, train_model_name=train_model_name,
+                                             folder_save=folder_save, model=model, calibration=calibration,
+                                             shuffled=True)
+
+        except Exception as e:
+            self.log.error(f"Function train_from_feature_store: {e}")
+            raise Exception(e)
+
+    @timed("training.run_pipeline")
+    def run_pipeline(self, dataframe, cleaner, label_col="sentiment", n_jobs=1,
+                     cleaned_save_path=None, file_format="feather", cache=None,
+                     vector_params=None, top_k=None, prune_method="chi2", deduplicator=None, feature_store=None,
+                     calibration=None):
+        """Cleans, vectorizes and trains in one process without writing the cleaned data to csv first
+
+        Args:
+            dataframe (pandas.DataFrame): raw DataFrame, the review is the first column.
+            cleaner (Cleaner): Cleaner used for the review column.
+            label_col (str, optional): name of the label column. Defaults to "sentiment".
+            n_jobs (int, optional): Number of processes used for cleaning, -1 uses every core. Defaults to 1.
+            cleaned_save_path (str/path, optional): where to save the cleaned data in the background, None->don't save. Defaults to None.
+            file_format (str, optional): format of the saved cleaned data, "feather", "parquet" or "csv". Defaults to "feather".
+            cache (CleanedReviewCache, optional): cache of cleaned reviews, only new reviews are cleaned. Defaults to None.
+            vector_params (dict, optional): arguments of the TfidfVectorizer, for example min_df and max_df. Defaults to None.
+            top_k (int, optional): feature budget, see prune_features, the features are chosen on the training rows only
+                so the test scores stay honest. Defaults to None: no pruning.
+            prune_method (str, optional): selection method of prune_features. Defaults to "chi2".
+            deduplicator (Deduplicator, optional): collapses exact and near duplicate cleaned reviews before vectorizing,
+                its report is added to the metrics. Defaults to None: no deduplication.
+            feature_store (FeatureStore, optional): trains through train_from_feature_store, so a corpus vectorized
+                before is mapped back instead. Not used with top_k. Defaults to None.
+            calibration (str, optional): "sigmoid", "isotonic" or None, see train_model. Defaults to None.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            (str,str): confusion_matrix , classification_report
+        """
+        try:
+            self.log.info("Entered function run_pipeline")
+            # cleaning replaces the review column, keep the raw reviews for the stem table
+            raw_reviews = dataframe[dataframe.columns[0]]
+            df_cleaned = cleaner.ret_cleaned_dataframe(dataframe, n_jobs=n_jobs, cache=cache)
+            if deduplicator is not None:
+                df_cleaned = deduplicator.deduplicate(df_cleaned, label_col=label_col)
+
+            save_thread = None
+            if cleaned_save_path:
+                save_thread = cleaner.save_dataframe_in_background(df_cleaned, cleaned_save_path, file_format)
+
+            if feature_store is not None and not top_k:
+                result = self.train_from_feature_store(df_cleaned, df_cleaned[label_col], feature_store,
+                                                       vector_params=vector_params, calibration=calibration)
+            else:
+                x_vector = self.vectorize(data=df_cleaned, vector_params=vector_params, folder_save=not top_k)
+                if top_k:
+                    # the same split as train_model, the test labels must not choose the features
+                    x_train, x_test, y_train, y_test = train_test_split(x_vector, df_cleaned[label_col],
+                                                                        test_size=0.25, random_state=15)
+                    pruned, x_train = self.prune_features(self.vector, x_train, y_train,
+                                                          top_k=top_k, method=prune_method)
+                    keep = np.array([self.vector.vocabulary_[term]
+                                     for term in sorted(pruned.vocabulary_, key=pruned.vocabulary_.get)], dtype=int)
+                    x_test = x_test[:, keep]
+                    self.vector = pruned
+                    with open(os.path.join(self.training_folder_path, "vectorize.pickle"), 'wb') as f:
+                        pickle.dump(self.vector, f)
+                    self.log.info("Pruned Vector Model Saved Successfully!!!")
+                    result = self.train_model_on_split(x_train, x_test, y_train, y_test, calibration=calibration)
+                else:
+                    result = self.train_model(x_vector, df_cleaned[label_col], calibration=calibration)
+            if deduplicator is not None:
+                self.metrics["deduplication"] = deduplicator.report
+            self.save_stem_table(raw_reviews, cleaner)
+
+            if save_thread:
+                save_thread.join()
+            return result
+
+        except Exception as e:
+            self.log.error(f"Function run_pipeline: {e}")
             raise Exception(e)
+
+    @timed("training.save_stem_table")
+    def save_stem_table(self, raw_reviews, cleaner, stem_table_name="stem_table.pickle"):
+        """Saves the surface word -> stem table of the training words next to the vector model, only the words
+        whose stem is part of the vocabulary are kept. PredictAPI hands it to its Cleaner, which then
+        looks those words up instead of running the stemmer.
+
+        Args:
+            raw_reviews (pandas.Series): reviews before cleaning.
+            cleaner (Cleaner): Cleaner the reviews were cleaned with.
+            stem_table_name (str, optional): name of the table. Defaults to "stem_table.pickle".
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            dict: the table
+        """
+        try:
+            # the vocabulary may hold n-grams, the table is about the single words
+            keep = {word for term in self.vector.vocabulary_ for word in term.split(" ")}
+            stem_table = cleaner.build_stem_table(raw_reviews, keep=keep)
+
+            save_path = os.path.join(self.training_folder_path, stem_table_name)
+            with open(save_path, 'wb') as f:
+                pickle.dump(stem_table, f)
+            self.log.info(f"Stem Table of {len(stem_table)} words Saved Successfully at {save_path}!!!")
+            return stem_table
+
+        except Exception as e:
+            self.log.error(f"Function save_stem_table: {e}")
+            raise Exception(e)
+
+    @timed("training.export_artifact")
+    def export_artifact(self, vector_model_name="vectorize.pickle", train_model_name="svc_model.sav",
+                        artifact_name="model.artifact"):
+        """Writes the saved vector model and prediction model as one memory mapped artifact,
+        worker processes map it instead of unpickling their own copy
+
+        Args:
+            vector_model_name (str, optional): Name of the vector model. Defaults to "vectorize.pickle".
+            train_model_name (str, optional): name of the model. Defaults to "svc_model.sav".
+            artifact_name (str, optional): name of the artifact. Defaults to "model.artifact".
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            str: path of the artifact
+        """
+        try:
+            with open(os.path.join(self.training_folder_path, vector_model_name), 'rb') as f:
+                vector = pickle.load(f)
+            model = joblib.load(os.path.join(self.training_folder_path, train_model_name))
+
+            save_path = os.path.join(self.training_folder_path, artifact_name)
+            export_artifact(vector, model, save_path)
+            self.log.info(f"Artifact Saved Successfully at {save_path}!!!")
+            return save_path
+
+        except Exception as e:
+            self.log.error(f"Function export_artifact: {e}")
+            raise Exception(e)
+
+    @timed("training.sweep")
+    def sweep(self, data, y, vector_grid=None, model_grid=None, cv=5, n_jobs=-1,
+              vector_model_name="vectorize.pickle", train_model_name="svc_model.sav",
+              leaderboard_name="sweep_leaderboard.json", folder_save=True):
+        """Cross validates every (vectorizer config, model) candidate in parallel, then saves the best one
+        and a leaderboard. Every vectorizer config is fitted and transformed once and its matrix is shared by
+        all the model candidates, so the vocabulary and idf see the whole data and not only the training folds.
+
+        Args:
+            data (pandas.Series/pandas.DataFrame): cleaned reviews, the first column for a DataFrame.
+            y (pandas.Series): labels.
+            vector_grid (list, optional): TfidfVectorizer arguments of every config. Defaults to None: DEFAULT_VECTOR_GRID.
+            model_grid (list, optional): (name in MODELS, arguments) of every model. Defaults to None: DEFAULT_MODEL_GRID.
+            cv (int, optional): number of stratified folds. Defaults to 5.
+            n_jobs (int, optional): Number of processes evaluating the candidates, -1 uses every core. Defaults to -1.
+            vector_model_name (str, optional): Name of the vector model. Defaults to "vectorize.pickle".
+            train_model_name (str, optional): name of the model. Defaults to "svc_model.sav".
+            leaderboard_name (str, optional): name of the leaderboard json. Defaults to "sweep_leaderboard.json".
+            folder_save (bool, optional): Whether to save the best models and the leaderboard. Defaults to True.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            (list,str,str): leaderboard best first, confusion_matrix and classification_report of the best candidate
+        """
+        try:
+            self.log.info("Entered function sweep")
+            x = data if isinstance(data, pd.Series) else data[data.columns[0]]
+            y = np.asarray(y)
+            vector_grid = vector_grid or DEFAULT_VECTOR_GRID
+            model_grid = model_grid or DEFAULT_MODEL_GRID
+
+            vectorized = list()
+            for vector_params in vector_grid:
+                start = time.perf_counter()
+                vector = TfidfVectorizer(**vector_params)
+                x_vector = vector.fit_transform(x)
+                vectorized.append((vector, x_vector, time.perf_counter() - start))
+                self.log.info(f"Vectorized with {vector_params}: {x_vector.shape[1]} features")
+
+            folds = list(StratifiedKFold(n_splits=cv, shuffle=True, random_state=15).split(np.zeros(len(y)), y))
+            candidates = [(i, name, params) for i in range(len(vectorized)) for name, params in model_grid]
+            self.log.info(f"Cross validating {len(candidates)} candidates with {cv} folds")
+            scores = Parallel(n_jobs=n_jobs)(
+                delayed(_cross_validate)(vectorized[i][1], y, MODELS[name](**params), folds)
+                for i, name, params in candidates)
+
+            leaderboard = list()
+            for (i, name, params), score in zip(candidates, scores):
+                vector, x_vector, vectorize_seconds = vectorized[i]
+                leaderboard.append(dict(score, vectorizer=_jsonable(vector_grid[i]), model=name, params=params,
+                                        n_features=x_vector.shape[1], vectorize_seconds=vectorize_seconds,
+                                        vector_index=i))
+            leaderboard.sort(key=lambda row: row["f1_weighted_mean"], reverse=True)
+            for rank, row in enumerate(leaderboard, start=1):
+                row["rank"] = rank
+
+            best = leaderboard[0]
+            self.log.info(f"Best candidate: {best['model']} {best['params']} with {best['vectorizer']}, "
+                          f"F1 weighted={best['f1_weighted_mean']:.3f}")
+
+            vector, x_vector, _ = vectorized[best["vector_index"]]
+            self.vector = vector
+            if folder_save:
+                with open(os.path.join(self.training_folder_path, vector_model_name), 'wb') as f:
+                    pickle.dump(vector, f)
+                with open(os.path.join(self.training_folder_path, leaderboard_name), "w") as f:
+                    json.dump(leaderboard, f, indent=2)
+                self.log.info("Best Vector Model and Leaderboard Saved Successfully!!!")
+
+            cm, cl_report = self.train_model(x_vector, y, train_model_name=train_model_name, folder_save=folder_save,
+                                             model=MODELS[best["model"]](**best["params"]))
+            return leaderboard, cm, cl_report
+
+        except Exception as e:
+            self.log.error(f"Function sweep: {e}")
+            raise Exception(e)
+
+    def prune_features(self, vector, x_vector, y, top_k=None, method="chi2"):
+        """Keeps only the most useful features, the vectorizer returned has the smaller vocabulary and idf
+        so the pickle, the memory of every worker and the vocabulary lookups shrink with it
+
+        Args:
+            vector (TfidfVectorizer): fitted vector model.
+            x_vector (sparse_matrix): output of the vector model, used to score the features.
+            y (pandas.Series): labels.
+            top_k (int, optional): features kept by "chi2" and "weight". Defaults to None: keep everything.
+            method (str, optional): "chi2" -> top_k by chi2 score, "weight" -> top_k by |LinearSVC weight|,
+                "l1" -> features with a non-zero weight in an l1 penalised LinearSVC. Defaults to "chi2".
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            (TfidfVectorizer, sparse_matrix): pruned vector model, x_vector restricted to the kept features
+        """
+        try:
+            n_features = x_vector.shape[1]
+            if method == "chi2":
+                scores = np.nan_to_num(chi2(x_vector, y)[0])
+            elif method == "weight":
+                scores = np.abs(LinearSVC().fit(x_vector, y).coef_).max(axis=0)
+            elif method == "l1":
+                scores = np.abs(LinearSVC(penalty="l1", dual=False).fit(x_vector, y).coef_).max(axis=0)
+                top_k = min(top_k or n_features, int((scores > 0).sum()))
+            else:
+                raise ValueError(f"unknown method '{method}'")
+
+            if not top_k or top_k >= n_features:
+                return vector, x_vector
+            keep = np.sort(np.argsort(scores)[::-1][:top_k])
+            self.log.info(f"Pruning features with {method}: keeping {len(keep)} of {n_features}")
+            return _restrict_vector(vector, keep), x_vector[:, keep]
+
+        except Exception as e:
+            self.log.error(f"Function prune_features: {e}")
+            raise Exception(e)
+
+    @timed("training.feature_budget_report")
+    def feature_budget_report(self, data, y, budgets=(None, 100000, 50000, 20000, 5000), method="chi2",
+                              vector_params=None, report_name="feature_budget.json", folder_save=True):
+        """Measures the size, transform latency and accuracy of the model at every feature budget, the features are
+        chosen and the model fitted on the training split only so the scores are honest
+
+        Args:
+            data (pandas.Series/pandas.DataFrame): cleaned reviews, the first column for a DataFrame.
+            y (pandas.Series): labels.
+            budgets (tuple, optional): number of features kept, None for all of them. Defaults to (None, 100000, 50000, 20000, 5000).
+            method (str, optional): selection method of prune_features. Defaults to "chi2".
+            vector_params (dict, optional): arguments of the TfidfVectorizer, for example min_df and max_df. Defaults to None.
+            report_name (str, optional): name of the json report. Defaults to "feature_budget.json".
+            folder_save (bool, optional): Whether to save the report. Defaults to True.
+
+        Raises:
+            Exception: any Exception, check logs for specifics
+
+        Returns:
+            list: one dict per budget with n_features, size_bytes, transform_us_per_review and f1_weighted
+        """
+        try:
+            self.log.info("Entered function feature_budget_report")
+            x = data if isinstance(data, pd.Series) else data[data.columns[0]]
+            x_train, x_test, y_train, y_test = train_test_split(x, np.asarray(y), test_size=0.25, random_state=15)
+
+            vector = TfidfVectorizer(**(vector_params or {}))
+            x_train_vector = vector.fit_transform(x_train)
+            sample = x_test.tolist()[:1000]
+
+            report = list()
+            for budget in budgets:
+                pruned, x_pruned = self.prune_features(vector, x_train_vector, y_train, top_k=budget, method=method)
+                model = LinearSVC().fit(x_pruned, y_train)
+
+                start = time.perf_counter()
+                pruned.transform(sample)
+                transform_us = (time.perf_counter() - start) / max(len(sample), 1) * 1e6
+
+                f1 = f1_score(y_test, model.predict(pruned.transform(x_test)), average="weighted")
+                row = {"budget": budget, "method": method, "n_features": len(pruned.vocabulary_),
+                       "size_bytes": len(pickle.dumps(pruned)) + len(pickle.dumps(model)),
+                       "transform_us_per_review": transform_us, "f1_weighted": f1}
+                report.append(row)
+                self.log.info(f"Feature budget {budget}: {row['n_features']} features, {row['size_bytes']} bytes, "
+                              f"{transform_us:.1f}us per review, F1 weighted={f1:.3f}")
+
+            if folder_save:
+                with open(os.path.join(self.training_folder_path, report_name), "w") as f:
+                    json.dump(report, f, indent=2)
+                self.log.info("Feature Budget Report Saved Successfully!!!")
+            return report
+
+        except Exception as e:
+            self.log.error(f"Function feature_budget_report: {e}")
+            raise Exception(e)
+
+
+def _restrict_vector(vector, keep):
+    # a fitted vectorizer knowing only the kept columns, in their original order
+    if not vector.use_idf:
+        raise ValueError("feature pruning needs a vectorizer with use_idf=True")
+    terms = np.empty(len(vector.vocabulary_), dtype=object)
+    for term, column in vector.vocabulary_.items():
+        terms[column] = term
+
+    pruned = TfidfVectorizer(**dict(vector.get_params(), vocabulary={term: i for i, term in enumerate(terms[keep])}))
+    pruned.idf_ = vector.idf_[keep]
+    # the same dict as vocabulary_, so the pickle stores it once
+    pruned.vocabulary = pruned.vocabulary_
+    return pruned
+
+
+def _cross_validate(x_vector, y, model, folds):
+    # runs in a joblib worker, the matrix is memory mapped rather than copied
+    f1_scores = list()
+    fit_seconds = list()
+    for train_index, test_index in folds:
+        start = time.perf_counter()
+        model.fit(x_vector[train_index], y[train_index])
+        fit_seconds.append(time.perf_counter() - start)
+        f1_scores.append(f1_score(y[test_index], model.predict(x_vector[test_index]), average="weighted"))
+    return {"f1_weighted_mean": float(np.mean(f1_scores)), "f1_weighted_std": float(np.std(f1_scores)),
+            "fit_seconds": float(np.mean(fit_seconds))}
+
+
+def _jsonable(params):
+    return {key: list(value) if isinstance(value, tuple) else value for key, value in params.items()}